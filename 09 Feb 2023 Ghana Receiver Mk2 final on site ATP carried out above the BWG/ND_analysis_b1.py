@@ -16,6 +16,9 @@ import numpy as np
 #import time
 #import telnetlib
 import matplotlib.pyplot as plt
+import sys
+sys.path.append('..')  # shared modules live in the repository root
+import lazy_loader as ll
 #from SpectrumAnalyzerSocket import sa_sock #Import the Spectrum Analyser Socket Function
 #import mwavepy as mv
 #import pandas as pd
@@ -41,10 +44,13 @@ meas = 'nom_gain_night'
 #-----------------------------------------------------------------------------
 freq =np.load(band+'/DUTfreq.npy')
 #Tref_hot=np.load('Tref_hot.npy') # DUT output measured noise tempeature for hot load (K)
-Pout_hot=np.load(band+'/'+band+'_'+meas+'_hot.npy') # DUT output noise tempeature for cold load (K)
-Pout_cold=np.load(band+'/'+band+'_'+meas+'_cold.npy') # Measured noise tempeature for calibrated hot load (K)
+Pout_hot=ll.LazyArray(band+'/'+band+'_'+meas+'_hot.npy') # DUT output noise tempeature for cold load (K)
+Pout_cold=ll.LazyArray(band+'/'+band+'_'+meas+'_cold.npy') # Measured noise tempeature for calibrated hot load (K)
 
 numPoints=len(freq)
+# varables used to trim data down (found by IF frequency, so any point count or a stitched grid works)
+data_s = np.searchsorted(freq, 704e6)
+data_f = np.searchsorted(freq, 832e6)
 
 #%%
 ###-----------------------------------------------------------------------------#
@@ -83,12 +89,12 @@ plt.figure(2)
 plt.clf()
 plt.plot(5749-freq/1e6,teff_5k-teff, linewidth=1,color='black',alpha=0.6 , label='5k trace')
 #plt.plot(5749-freq/1e6,teff_20k-teff, linewidth=1,color='r', label='$20k$')
-plt.plot([5749-freq[336]/1e6,5749-freq[464]/1e6],
-         [np.mean(teff_5k[336:464]-teff[336:464]),
-          np.mean(teff_5k[336:464]-teff[336:464])], 
+plt.plot([5749-freq[data_s]/1e6,5749-freq[data_f]/1e6],
+         [np.mean(teff_5k[data_s:data_f]-teff[data_s:data_f]),
+          np.mean(teff_5k[data_s:data_f]-teff[data_s:data_f])], 
           linewidth=3,
           color='#8F94CC',
-          label='5k mean value over the band = %.2f k'%(np.mean(teff_5k[372:464]-teff[372:464])))
+          label='5k mean value over the band = %.2f k'%(np.mean(teff_5k[np.searchsorted(freq, 740e6):data_f]-teff[np.searchsorted(freq, 740e6):data_f])))
 
 plt.fill_between([4917,5045,5045,4917],
                  [5.45,5.45,4.55,4.55],
@@ -122,12 +128,12 @@ plt.figure(3)
 plt.clf()
 plt.plot(5749-freq/1e6,teff_20k-teff, linewidth=1,color='black', alpha=0.6, label='20k trace')
 #plt.plot(5749-freq/1e6,teff_20k-teff, linewidth=1,color='r', label='$20k$')
-plt.plot([5749-freq[336]/1e6,5749-freq[464]/1e6],
-         [np.mean(teff_20k[336:464]-teff[336:464]),
-          np.mean(teff_20k[336:464]-teff[336:464])],
+plt.plot([5749-freq[data_s]/1e6,5749-freq[data_f]/1e6],
+         [np.mean(teff_20k[data_s:data_f]-teff[data_s:data_f]),
+          np.mean(teff_20k[data_s:data_f]-teff[data_s:data_f])],
           linewidth=3,
           color='#8F94CC',
-          label='20k mean value over the band = %.2f k'%(np.mean(teff_20k[336:464]-teff[336:464])))
+          label='20k mean value over the band = %.2f k'%(np.mean(teff_20k[data_s:data_f]-teff[data_s:data_f])))
 
 
 plt.fill_between([4917,5045,5045,4917],
@@ -16,6 +16,9 @@ import numpy as np
 #import time
 #import telnetlib
 import matplotlib.pyplot as plt
+import sys
+sys.path.append('..')  # shared modules live in the repository root
+import lazy_loader as ll
 #from SpectrumAnalyzerSocket import sa_sock #Import the Spectrum Analyser Socket Function
 #import mwavepy as mv
 #import pandas as pd
@@ -41,10 +44,13 @@ meas = 'nom_gain_night'
 #-----------------------------------------------------------------------------
 freq =np.load(band+'/DUTfreq.npy')
 #Tref_hot=np.load('Tref_hot.npy') # DUT output measured noise tempeature for hot load (K)
-Pout_hot=np.load(band+'/'+band+'_'+meas+'_hot.npy') # DUT output noise tempeature for cold load (K)
-Pout_cold=np.load(band+'/'+band+'_'+meas+'_cold.npy') # Measured noise tempeature for calibrated hot load (K)
+Pout_hot=ll.LazyArray(band+'/'+band+'_'+meas+'_hot.npy') # DUT output noise tempeature for cold load (K)
+Pout_cold=ll.LazyArray(band+'/'+band+'_'+meas+'_cold.npy') # Measured noise tempeature for calibrated hot load (K)
 
 numPoints=len(freq)
+# varables used to trim data down (found by IF frequency, so any point count or a stitched grid works)
+data_s = np.searchsorted(freq, 568e6)
+data_f = np.searchsorted(freq, 968e6)
 
 #%%
 ###-----------------------------------------------------------------------------#
@@ -88,12 +94,12 @@ plt.plot(5982+freq/1e6,
          alpha=0.6,
          label='5k trace')
 #plt.plot(5749-freq/1e6,teff_20k-teff, linewidth=1,color='r', label='$20k$')
-plt.plot([5982+freq[200]/1e6,5982+freq[600]/1e6],
-         [np.mean(teff_5k[200:600]-teff[200:600]),
-          np.mean(teff_5k[200:600]-teff[200:600])], 
+plt.plot([5982+freq[data_s]/1e6,5982+freq[data_f]/1e6],
+         [np.mean(teff_5k[data_s:data_f]-teff[data_s:data_f]),
+          np.mean(teff_5k[data_s:data_f]-teff[data_s:data_f])], 
           linewidth=3,
           color='#8F94CC',
-          label='5k mean value over the band = %.2f k'%(np.mean(teff_5k[200:600]-teff[200:600])))
+          label='5k mean value over the band = %.2f k'%(np.mean(teff_5k[data_s:data_f]-teff[data_s:data_f])))
 
 plt.fill_between([6550,6950,6950,6550],
                  [5.45,5.45,4.55,4.55],
@@ -130,12 +136,12 @@ plt.plot(5982+freq/1e6,
          color='black',
          label='20k trace')
 #plt.plot(5749-freq/1e6,teff_20k-teff, linewidth=1,color='r', label='$20k$')
-plt.plot([5982+freq[200]/1e6,5982+freq[600]/1e6],
-         [np.mean(teff_20k[200:600]-teff[200:600]),
-          np.mean(teff_20k[200:600]-teff[200:600])], 
+plt.plot([5982+freq[data_s]/1e6,5982+freq[data_f]/1e6],
+         [np.mean(teff_20k[data_s:data_f]-teff[data_s:data_f]),
+          np.mean(teff_20k[data_s:data_f]-teff[data_s:data_f])], 
           linewidth=3,
           color='#8F94CC',
-          label='20k mean value over the band = %.2f k'%(np.mean(teff_20k[200:600]-teff[200:600])))
+          label='20k mean value over the band = %.2f k'%(np.mean(teff_20k[data_s:data_f]-teff[data_s:data_f])))
 
 
 plt.fill_between([6550,6950,6950,6550],
@@ -0,0 +1,54 @@
+#!/usr/bin/env python/
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+This script captures Pout_hot and Pout_cold for all four receiver chains in one hot/cold cycle.
+Each chain is connected to its own SignalShark (or socket task) and is captured concurrently,
+saving to its own band directory with the same file names as capture_data_from_spectrum_analyser.py.
+The b1/b2 analysis scripts can then be run on every chain.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import sys
+sys.path.append('..')  # shared modules live in the repository root
+import measurement_sequencer as sq
+import multi_chain_capture as mcc
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+f_start=(768-400) #Start frequency in MHz set for the downconverted band
+f_stop=(768+400) #Stop frequency in MHz set for the downconverted band
+Rbw=2 #Resolution BW of spectrum analyser in MHz
+Atten=10 #Set spectrum analyser attenuation
+meas_time = 100 #Measurement time in milli seconds
+numSweeps = 20 # Number of sweeps for each measurement
+transfer = 'binary' # Trace transfer format: 'ascii' or 'binary'
+pipelined = True # Decode sweep i while sweep i+1 is triggered
+resume = False # Carry on from the last good sweep of an interrupted capture
+precision = 'float64' # Stored power precision: 'float32' halves memory and file size
+
+meas = 'nom_gain' # this is the file name. Add the gain and noise diode setting
+sequence = sq.YFACTOR_SEQUENCE # hot then cold; sq.FULL_SEQUENCE adds the 5 K and 20 K ND states
+switch = sq.ManualSwitch() # load/noise diode driver shared by all chains
+
+# band: analyser VISA resource of each chain. The band name is also the output directory.
+# There are no default addresses: fill in the analyser connected to every chain before a run
+# (the single chain scripts use 'TCPIP0::192.168.2.124::5300::SOCKET'). open_chains refuses to
+# start while any chain has no address.
+addresses = {'B1LCP': '',
+             'B1RCP': '',
+             'B2LCP': '',
+             'B2RCP': ''}
+chains = [mcc.Chain(band, address) for band, address in sorted(addresses.items())]
+
+#%%
+# Set up the spectrum analysers
+mcc.open_chains(chains, transfer=transfer, f_start=f_start, f_stop=f_stop, Rbw=Rbw,
+                meas_time=meas_time, Atten=Atten)
+
+#%%
+# Capture every state on all chains
+mcc.capture_chains(chains, meas, sequence, switch, numSweeps, transfer, pipelined, resume, dtype=precision)
@@ -15,13 +15,24 @@ This script's primary function is to capture the data required to do the calcula
 import numpy as np
 import pyvisa
 import time
+import os
+import sys
 from numpy import double
+sys.path.append('..')  # shared modules live in the repository root
+import spectrum_analyser as sa
+import sweep_acquisition as acq
+import measurement_sequencer as sq
+import sweep_statistics as st
+import stitched_capture as sc
+import lazy_loader as ll
+import scpi_session as scpi
 #%%
 #Constants and variable definitions
 #-----------------------------------------------------------------------------#
 f_start=(768-400) #Start frequency in MHz set for the downconverted band
 f_stop=(768+400) #Stop frequency in MHz set for the downconverted band
-numPoints=801 #Number of measurement points - keep this in order to get 1 MHz per datapoint
+# The number of measurement points is set by the analyser (801 gives 1 MHz per datapoint); the
+# arrays below are sized from SPECTRUM:DATA:COUNT?, so 8001 or 32001 point captures need no changes here
 
 # stop_f_set=f_stop
 # start_f_set=f_start
@@ -33,9 +44,34 @@ RefLev=-20 # Set reference level of spectrum analyser
 Atten=10 #Set spectrum analyser attenuation
 k=1.38e-23 #Boltzman's constand
 numSweeps = 20 # Number of sweeps for each measurement
+transfer = 'binary' # Trace transfer format: 'ascii' or 'binary' (float32 block, fewer bytes and no string parsing)
+pipelined = True # Decode sweep i on this thread while an I/O thread triggers sweep i+1
+bulk_batch = None # Queue this many sweeps per round trip and decode them in one pass (every sweep kept). None: one round trip per sweep
+averaging_blocks = None # Average on the SignalShark and transfer this many averaged traces per state
+                        # (1 = one trace, 4 = four block averages kept for variance estimation). None transfers every sweep
+raw_sweeps = 0 # With averaging_blocks, also keep this many individual sweeps in <name>_raw.npy for the bootstrap and Allan deviation
+force_reset = False # Always *RST the analyser instead of only sending the settings that changed
+resume = False # Carry on from the last good sweep of an interrupted capture (<name>_partial.npy)
+precision = 'float64' # Stored power precision: 'float32' halves memory and file size (the analysis checks Teff/gain against float64)
+sequence = None # e.g. sq.FULL_SEQUENCE to capture hot, cold, 5 K and 20 K ND states unattended
+switch = sq.ManualSwitch() # load/noise diode driver used by the sequence (sq.NullSwitch() for testing)
+
+# Adaptive sweep count: stop a load state once the projected Teff uncertainty over the band window
+# (st.analysis_window) is below teff_target. numSweeps is then the maximum number of sweeps.
+teff_target = None # K, e.g. 0.5. None always takes numSweeps sweeps
+minSweeps = 5 # Minimum number of sweeps per state in adaptive mode
+Tref_cold = 10.7 # Physical temperature of cold reference (K), as in the analysis scripts
+temp_hot_load_degrees_C = 31.5 # Hot load temperature read from the EMS
+Tref_hot = 273.15 + temp_hot_load_degrees_C
+live = True # Print the running Y-factor Teff and gain after each cold sweep (needs the _hot file)
+record_session = None # e.g. 'B1LCP/B1LCP_nom_gain_session.jsonl.gz' to record every SCPI command, response and latency
+replay_session = None # a recorded session to replay instead of connecting to the analyser (no instrument needed)
+replay_speed = 1.0 # 1 replays with the recorded latencies, 0 as fast as possible
 
 band = 'B2RCP'  # this is the directory that the data will be saved to
 meas = 'nom_gain' # this is the file name. Add the gain and noise diode setting
+spans = None # e.g. sc.span_plan(band): fine RBW over the sky band, coarse outside, stitched into one trace.
+             # None captures the single f_start..f_stop span
 
 
 # suggested naming convention
@@ -45,15 +81,20 @@ meas = 'nom_gain' # this is the file name. Add the gain and noise diode setting
 
 
 #%%
-rm = pyvisa.ResourceManager()
+if replay_session:
+    signal_shark = scpi.ReplaySession(replay_session, replay_speed)
+else:
+    rm = pyvisa.ResourceManager()
 
-# Connect to the signal shart specrum analyser
+    # Connect to the signal shart specrum analyser
 
-signal_shark = rm.open_resource('TCPIP0::192.168.2.124::5300::SOCKET')
-# connect to signal shark on 10.8.88.40 on port 5300 using socket
-signal_shark.read_termination = '\r\n'
-signal_shark.write_termination = '\r\n'
-signal_shark.timeout = 50000
+    signal_shark = rm.open_resource('TCPIP0::192.168.2.124::5300::SOCKET')
+    # connect to signal shark on 10.8.88.40 on port 5300 using socket
+    signal_shark.read_termination = '\r\n'
+    signal_shark.write_termination = '\r\n'
+    signal_shark.timeout = 50000
+if record_session:
+    signal_shark = scpi.RecordingSession(signal_shark, record_session) # saved when the script ends
 
 # Test the connection to the spectrum analyser by querying the *IDN? SCPI command
 print(signal_shark.query("*IDN?"))
@@ -61,43 +102,16 @@ print(signal_shark.query("*IDN?"))
 #%%
 # Set up the spectrum analyser
 
-signal_shark.write('SYSTEM:REMOTE:DISPLAY OFF')  # disable GUI for higher performance
-signal_shark.write('*RST')  # Reset signal shark
-print(signal_shark.write("TASK:NEW? 'SPECTRUM'")) #  Start new task set instrument to spectrum
-# Do not use RT_SPECTRUM only has 40 MHz span
-
-signal_shark.write('SENSE:STOP')  # Stop the measuring system for configuration
-print(signal_shark.query('SYSTEM:ERROR:ALL?'))  # Check for errors
-print(signal_shark.write('SYSTem:REMote:TIMeout 20')) #  Set remote timeout to 20 s
-print('Signal shark remote timeout: '+signal_shark.query('SYSTem:REMote:TIMeout?')+' s' )  # check that the remote timeout was set
-
-#Configure the measurement task
-# signal_shark.write('TASK:NEW')
-print(signal_shark.write('SPECtrum:FREQuency:ENTRy:MODE FSTART_FSTOP'))  # Set frequecy entry mode type
-print(signal_shark.write('SENSE:ATTENUATOR: %idB' %Atten))  # Set attenuator
-print(signal_shark.write('SPEC:FREQ:START %i MHZ' %f_start))  # Set start frequency
-print(signal_shark.write('SPEC:FREQ:STOP %i MHZ' %f_stop))  # set stop frequency
-print(signal_shark.write('SPECTRUM:RBW %i MHz'%Rbw))  # Set the resolution bandwidth
-print('RBW:'+signal_shark.query('SPECTRUM:RBW?')+' Hz')  # read the resolution BW from the analyser
-
-
-#Instead of VBW, we set the measurement time in milli seconds
-meas_time = 100
-print(signal_shark.write('SPECTRUM:MEAS:TIME %ims'%meas_time))  # Set spectrum analyser measurement time
-print('Meas_time:'+signal_shark.query('SPECTRUM:MEAS:TIME?')+' s per bin')  # 
-
-
-# print(signal_shark.write('SPECTRUM:VBW %i MHz'%Vbw))
-#set the frequency step
+# Only the settings that differ from the analyser's current state are sent; set force_reset
+# to do the full *RST and new SPECTRUM task (do not use RT_SPECTRUM only has 40 MHz span)
+meas_time = 100 #Instead of VBW, we set the measurement time in milli seconds
+config = sa.AnalyserConfig(f_start, f_stop, Rbw, meas_time, Atten)
+config.apply(signal_shark, force_reset)
 
 start_f_set = double(signal_shark.query('SPECTRUM:FREQUENCY:START?'))
 stop_f_set = double(signal_shark.query('SPECTRUM:FREQUENCY:STOP?'))
 # step_f_set = signal_shark.query('SPECTRUM:DATA:FREQUENCY:STEP?')
 #        stop_f = start_f + (nr_points-1)*delta_f
-print(signal_shark.write('SPECTRUM:TRACE:ENABLE RMS,ON'))
-print(signal_shark.write('SPECTRUM:TRACE:ENABLE PPk,OFF'))
-print(signal_shark.write('SPECTRUM:SCAN:COUNT 1'))
-
 print('Trace type:'+signal_shark.query('SPECTRUM:TRACE:LIST?'))
 
 print('SA Start Freq: %s MHz, Stop Freq: %s MHz'% \
@@ -114,8 +128,10 @@ print(signal_shark.query('SPECTRUM:DATA:UPDATE?') )
 #Stop the measurement
 # print(signal_shark.write('SENSE:HOLD'))
 
-# Fetch the measurement data
-data=signal_shark.query('SPEC:DATA:LEVel? RMS')
+# Fetch the measurement data (the format is selected first: without *RST the analyser keeps
+# the transfer format of the previous run)
+sa.set_trace_format(signal_shark, transfer)  # select the trace transfer format for this and the sweeps below
+data, nbytes = sa.fetch_trace(signal_shark, transfer)
 
 nr_points_set = int(signal_shark.query('SPECTRUM:DATA:COUNT?'))
 print('number of frequency points = %i'%nr_points_set)
@@ -131,59 +147,68 @@ freq = np.arange(nr_points_set)*freq_delta_set + start_f_set
 
 np.save(band+'/DUTfreq',freq) # save a numpy array that contains frequency data
 
-dataTrace=np.zeros((numSweeps,numPoints),dtype=float) # array for storing data
+numPoints=nr_points_set # Number of measurement points, as reported by the analyser
+dataTrace=np.zeros((numSweeps,numPoints),dtype=precision) # array for storing data, the stores use its precision
 
 
 
+#%%
+#Unattended measurement sequence: every state for this band in one session
+if sequence:
+    sq.run_sequence(signal_shark, band, meas, sequence, switch, dataTrace, transfer, pipelined, resume,
+                    teff_target, minSweeps, Tref_hot, Tref_cold)
+
 #%%
 #Get data
 # -----------------------------------------------------------------------------
 #Measure Tref_hot
 # keyIn = input('Connect hot load. Ready? (y/n):')
-# if keyIn=='y':
-#     i=0
-#     for i in range (0,numSweeps):
-        
-#         # Run the measurement and return 0 on completion  
-#         print(signal_shark.query('RUN:SINGLE?') ) 
-
-#         # Update the measurment data
-#         print(signal_shark.query('SPECTRUM:DATA:UPDATE?') ) 
-
-#         #Stop the measurement
-        
-#         # print(signal_shark.write('SENSE:HOLD'))
-
-#         # Fetch the measurement data
-#         temp=(signal_shark.query('SPEC:DATA:LEVel? RMS'))  
-#         temp2=temp.split(',')
-#         dataTrace[i,:]=np.array(temp2,dtype=float) # Get trace data and change data into a numpy array (dBm)
-#         print ("Tref_hot measurement # %i of %i" %(i+1,numSweeps))
-#     Pout_hot=(10**(dataTrace/10)*1e-3) # Convert to linear power (W)
-#     np.save(band+'/'+band+'_'+meas+'_hot',Pout_hot)
+# if keyIn=='y' and spans:
+#     freq, Pout_hot = sc.capture_stitched(signal_shark, band+'/'+band+'_'+meas+'_hot', spans, numSweeps,
+#                                          transfer, pipelined, Atten, Rbw, resume, dtype=precision) # Linear power (W) scaled to Rbw
+#     np.save(band+'/DUTfreq', freq) # the stitched frequency axis
+# elif keyIn=='y' and teff_target:
+#     Pout_hot=st.adaptive_capture(signal_shark, band+'/'+band+'_'+meas+'_hot', dataTrace, 'hot',
+#                                  st.analysis_window(band, numPoints), Tref_hot, Tref_cold, teff_target,
+#                                  minSweeps, None, transfer, pipelined, resume)
+# elif keyIn=='y' and averaging_blocks:
+#     Pout_hot=acq.capture_averaged(signal_shark, band+'/'+band+'_'+meas+'_hot', numSweeps, averaging_blocks, numPoints,
+#                                   raw_sweeps, transfer, pipelined, label='Tref_hot', resume=resume,
+#                                   dtype=precision) # averaged on the analyser, blocks in ..._hot_averaging.json
+# elif keyIn=='y':
+#     store = acq.SweepStore(band+'/'+band+'_'+meas+'_hot', numSweeps, numPoints, resume, precision) # each sweep is written to disk as it arrives
+#     acq.acquire_sweeps(signal_shark, dataTrace, transfer, pipelined, label='Tref_hot',
+#                        start=store.completed, on_sweep=store.append, batch=bulk_batch,
+#                        telemetry=store.telemetry) # Run, update and fetch each sweep into dataTrace (dBm)
+#     Pout_hot=store.finalise() # Linear power (W) saved as band+'/'+band+'_'+meas+'_hot.npy', timing in ..._hot_telemetry.json
 
 #%%
 
 #Measure Pout_cold
-keyIn = input('Switch hot load off. Ready? (y/n):')
+keyIn = 'n' if sequence else input('Switch hot load off. Ready? (y/n):')
 if keyIn=='y':
-    i=0
-    for i in range (0,numSweeps):
-        
-        # Run the measurement and return 0 on completion  
-        print(signal_shark.query('RUN:SINGLE?') ) 
-
-        # Update the measurment data
-        print(signal_shark.query('SPECTRUM:DATA:UPDATE?') ) 
-
-        #Stop the measurement
-        # print(signal_shark.write('SENSE:HOLD'))
-
-        # Fetch the measurement data
-        temp=(signal_shark.query('SPEC:DATA:LEVel? RMS'))  
-        temp2=temp.split(',')
-        dataTrace[i,:]=np.array(temp2,dtype=float) # Get trace data and change data into a numpy array (dBm)
-        print ("Tref_cold measurement # %i of %i" %(i+1,numSweeps))
-    Pout_cold=(10**(dataTrace/10)*1e-3) # Convert to linear power (W)
-    np.save(band+'/'+band+'_'+meas+'_cold',Pout_cold)
+    hot_file = band+'/'+band+'_'+meas+'_hot.npy'
+    Pout_hot = ll.LazyArray(hot_file) if os.path.exists(hot_file) else None # used for the live result and adaptive stop, read in blocks
+    live_yf = None
+    if live and Pout_hot is not None:
+        live_yf = st.LiveYFactor(Pout_hot, st.analysis_window(band, numPoints), Tref_hot, Tref_cold, Rbw*1e6)
+if keyIn=='y' and spans:
+    freq, Pout_cold = sc.capture_stitched(signal_shark, band+'/'+band+'_'+meas+'_cold', spans, numSweeps,
+                                          transfer, pipelined, Atten, Rbw, resume, dtype=precision) # Linear power (W) scaled to Rbw
+    np.save(band+'/DUTfreq', freq) # the stitched frequency axis
+elif keyIn=='y' and teff_target:
+    Pout_cold=st.adaptive_capture(signal_shark, band+'/'+band+'_'+meas+'_cold', dataTrace, 'cold',
+                                  st.analysis_window(band, numPoints), Tref_hot, Tref_cold, teff_target,
+                                  minSweeps, Pout_hot, transfer, pipelined, resume, monitor=live_yf)
+elif keyIn=='y' and averaging_blocks:
+    Pout_cold=acq.capture_averaged(signal_shark, band+'/'+band+'_'+meas+'_cold', numSweeps, averaging_blocks, numPoints,
+                                   raw_sweeps, transfer, pipelined, label='Tref_cold', resume=resume, dtype=precision,
+                                   on_sweep=live_yf) # Block averaged linear power (W), blocks in ..._cold_averaging.json
+elif keyIn=='y':
+    store = acq.SweepStore(band+'/'+band+'_'+meas+'_cold', numSweeps, numPoints, resume, precision) # each sweep is written to disk as it arrives
+    store.replay(live_yf)
+    acq.acquire_sweeps(signal_shark, dataTrace, transfer, pipelined, label='Tref_cold',
+                       start=store.completed, on_sweep=acq.chain_callbacks(store.append, live_yf),
+                       batch=bulk_batch, telemetry=store.telemetry) # Run, update and fetch each sweep into dataTrace (dBm)
+    Pout_cold=store.finalise() # Linear power (W) saved as band+'/'+band+'_'+meas+'_cold.npy', timing in ..._cold_telemetry.json
 
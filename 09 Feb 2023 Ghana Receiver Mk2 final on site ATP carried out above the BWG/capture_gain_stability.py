@@ -0,0 +1,61 @@
+#!/usr/bin/env python/
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+This script measures receiver gain stability: the total power in the band's analysis window
+(B1 4917-5045 MHz, B2 6550-6950 MHz sky) and over the whole IF span is sampled at a fixed
+cadence for a long duration, e.g. a full night on the cold load.
+The samples are streamed to disk in chunks (band+'/'+band+'_'+meas+'.npy', one row of
+timestamp, window power and span power per sample), so the run can be left unattended and
+stopped with Ctrl-C at any time. Run with resume = True to continue an interrupted run.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import numpy as np
+import os
+import sys
+sys.path.append('..')  # shared modules live in the repository root
+import spectrum_analyser as sa
+import sweep_acquisition as acq
+import gain_stability as gs
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+f_start=(768-400) #Start frequency in MHz set for the downconverted band
+f_stop=(768+400) #Stop frequency in MHz set for the downconverted band
+Rbw=2 #Resolution BW of spectrum analyser in MHz
+Atten=10 #Set spectrum analyser attenuation
+meas_time = 100 #Measurement time per sample in milli seconds
+transfer = 'binary' # Trace transfer format: 'ascii' or 'binary'
+force_reset = False # Always *RST the analyser instead of only sending the settings that changed
+
+cadence = 1.0 # Time between samples in seconds
+duration = 12*3600 # Length of the run in seconds (12 hours); stop earlier with Ctrl-C
+chunk = 60 # Samples held in memory before they are written to disk
+resume = False # Carry on with an interrupted run (<name>_partial.npy)
+
+band = 'B1LCP'  # this is the directory that the data will be saved to
+meas = 'gain_stability_cold' # this is the file name. Add the load and gain setting
+
+#%%
+# Connect to the signal shark spectrum analyser and set it up
+signal_shark = sa.connect('TCPIP0::192.168.2.124::5300::SOCKET')
+print(signal_shark.query("*IDN?"))
+sa.AnalyserConfig(f_start, f_stop, Rbw, meas_time, Atten).apply(signal_shark, force_reset)
+acq.trigger_sweep(signal_shark)  # the point count is valid after the first sweep
+freq = sa.frequency_axis(signal_shark)
+sa.set_trace_format(signal_shark, transfer)
+os.makedirs(band, exist_ok=True)
+
+#%%
+# Sample the total power
+samples = gs.capture_gain_stability(signal_shark, band+'/'+band+'_'+meas, band, freq, cadence, duration,
+                                    transfer, chunk, resume)
+
+#%%
+# Normalised window power: fractional gain variation over the run
+print('window power: peak to peak variation %.3f %% over %.1f hours'
+      % (100*np.ptp(samples[:,1])/np.mean(samples[:,1]), (samples[-1,0]-samples[0,0])/3600))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+This script reads in a gain stability series captured with capture_gain_stability.py and plots
+the overlapping Allan deviation of the window and span power. The minimum of the Allan deviation
+is the longest useful integration time; beyond it gain drift dominates the radiometer noise.
+Optionally the per bin Allan deviation of a Y-factor sweep stack (_hot/_cold.npy) is shown too.
+"""
+#%%
+#Import functions that do the work
+#----------#
+import numpy as np
+import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.append('..')  # shared modules live in the repository root
+import allan_deviation as ad
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+band = 'B1LCP'
+meas = 'gain_stability_cold'
+sweep_stack = band+'/'+band+'_nom_gain_cold' # Y-factor capture for the per bin Allan deviation (None to skip)
+
+#-----------------------------------------------------------------------------
+samples = np.load(band+'/'+band+'_'+meas+'.npy', mmap_mode='r') # timestamp, window power, span power
+dt = np.median(np.diff(samples[:,0])) # sample interval (s)
+max_tau = (samples[-1,0]-samples[0,0])/ad.MIN_AVERAGES # longest integration time with enough averages
+
+#%%
+#Calculations
+#-----------------------------------------------------------------------------
+tau, adev, count = ad.allan_deviation(samples[:,1:], dt)
+for label, best in zip(('window', 'span'), ad.optimal_tau(tau, adev, max_tau)):
+    print('%s power: minimum Allan deviation at %.3g s' % (label, best))
+
+#%%
+###-----------------------------------------------------------------------------#
+###Plots
+###-----------------------------------------------------------------------------#
+##
+def plot_Allan():
+    ad.plot_allan(tau, adev, ('window power', 'span power'),
+                  band+" "+meas+" Allan deviation (%.1f hours)" % ((samples[-1,0]-samples[0,0])/3600),
+                  band+'/Allan_'+band+'_'+meas+'.png', fig_number=5, max_tau=max_tau)
+    return
+
+
+def plot_Allan_bins():
+    # Per bin Allan deviation of a sweep stack, the sweep interval comes from its telemetry
+    stack = ad.sweep_stack(sweep_stack) # the raw sweeps (_raw.npy) of a capture averaged on the analyser
+    Pout = np.load(stack+'.npy')
+    freq = np.load(band+'/DUTfreq.npy')
+    dt_sweep = ad.sweep_interval(stack) if os.path.exists(stack+'_telemetry.json') else 1.0
+    tau_bins, adev_bins, count_bins = ad.allan_deviation(Pout, dt_sweep)
+    plt.figure(6)
+    plt.clf()
+    plt.pcolormesh(freq/1e6, tau_bins, np.log10(adev_bins), shading='auto')
+    plt.yscale('log')
+    plt.colorbar(label='log10 Allan deviation')
+    plt.title(band+" per bin Allan deviation of "+os.path.basename(sweep_stack))
+    plt.xlabel("Frequency (MHz)")
+    plt.ylabel("Integration time (s)")
+    fig = plt.gcf()
+    fig.set_size_inches(8, 6, forward=True)
+    fig.savefig(band+'/Allan_bins_'+os.path.basename(sweep_stack)+'.png', dpi=200)
+    return
+
+#%%
+plot_Allan()
+if sweep_stack and os.path.exists(sweep_stack+'.npy'):
+    plot_Allan_bins()
@@ -27,7 +27,10 @@ import pyvisa
 # ------------------------
 # import socket
 import time
+import sys
 from numpy import double
+sys.path.append('..')  # shared modules live in the repository root
+import spectrum_analyser as sa
 #%%
 #Constants and variable definitions
 #-----------------------------------------------------------------------------#
@@ -35,7 +38,7 @@ f_start=(768-400) #Start frequency in MHz
 f_stop=(768+400) #Stop frequency in MHz
 #f_start=6550e6 #Start frequency
 #f_stop=6950e6 #Stop frequency
-numPoints=801 #Number of measurement points
+# The number of measurement points is set by the analyser and read back with SPECTRUM:DATA:COUNT?
 
 # stop_f_set=f_stop
 # start_f_set=f_start
@@ -47,6 +50,7 @@ RefLev=-20 # Set reference level of spectrum analyser
 Atten=10 #Set spectrum analyser attenuation
 k=1.38e-23 #Boltzman's constand
 numSweeps = 20 # Number of sweeps for each measurement
+transfer = 'binary' # Trace transfer format: 'ascii' or 'binary' (float32 block, fewer bytes and no string parsing)
 
 band = 'B2LCP'
 meas = 'nom_gain_-5d_BWG_mode_3'  #_5k_nd'
@@ -160,8 +164,11 @@ freq = np.arange(nr_points_set)*freq_delta_set + start_f_set
 
 np.save(band+'/DUTfreq',freq) # save a numpy array that contains frequency data
 
+numPoints=nr_points_set # Number of measurement points, as reported by the analyser
 dataTrace=np.zeros((numSweeps,numPoints),dtype=float) # array for storing data
 
+sa.set_trace_format(signal_shark, transfer)  # select the trace transfer format for the sweeps below
+
 
 
 #%%
@@ -184,10 +191,8 @@ dataTrace=np.zeros((numSweeps,numPoints),dtype=float) # array for storing data
 #         # print(signal_shark.write('SENSE:HOLD'))
 
 #         # Fetch the measurement data
-#         temp=(signal_shark.query('SPEC:DATA:LEVel? RMS'))  
-#         temp2=temp.split(',')
-#         dataTrace[i,:]=np.array(temp2,dtype=float) # Get trace data and change data into a numpy array (dBm)
-#         print ("Tref_hot measurement # %i of %i" %(i+1,numSweeps))
+#         nbytes, parse_time = sa.read_trace(signal_shark, dataTrace[i,:], transfer) # Get trace data straight into dataTrace (dBm)
+#         print ("Tref_hot measurement # %i of %i (%i bytes, parse %.2f ms)" %(i+1,numSweeps,nbytes,parse_time*1e3))
 #     Pout_hot=(10**(dataTrace/10)*1e-3) # Convert to linear power (W)
 #     np.save(band+'/'+band+'_'+meas+'_hot',Pout_hot)
 
@@ -209,10 +214,8 @@ if keyIn=='y':
         # print(signal_shark.write('SENSE:HOLD'))
 
         # Fetch the measurement data
-        temp=(signal_shark.query('SPEC:DATA:LEVel? RMS'))  
-        temp2=temp.split(',')
-        dataTrace[i,:]=np.array(temp2,dtype=float) # Get trace data and change data into a numpy array (dBm)
-        print ("Tref_cold measurement # %i of %i" %(i+1,numSweeps))
+        nbytes, parse_time = sa.read_trace(signal_shark, dataTrace[i,:], transfer) # Get trace data straight into dataTrace (dBm)
+        print ("Tref_cold measurement # %i of %i (%i bytes, parse %.2f ms)" %(i+1,numSweeps,nbytes,parse_time*1e3))
     Pout_cold=(10**(dataTrace/10)*1e-3) # Convert to linear power (W)
     np.save(band+'/'+band+'_'+meas+'_cold',Pout_cold)
 
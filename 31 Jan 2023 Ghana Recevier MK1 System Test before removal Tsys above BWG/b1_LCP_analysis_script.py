@@ -16,6 +16,12 @@ import numpy as np
 #import time
 #import telnetlib
 import matplotlib.pyplot as plt
+import sys
+sys.path.append('..')  # shared modules live in the repository root
+import lazy_loader as ll
+import result_cache as rc
+import robust_average as ra
+import gain_flatness as gf
 #from SpectrumAnalyzerSocket import sa_sock #Import the Spectrum Analyser Socket Function
 #import mwavepy as mv
 #import pandas as pd
@@ -49,8 +55,8 @@ wind = 'No wind'
 freq =np.load(band+'/DUTfreq.npy')
 skyfreq = (2081 + 3500)*1e6 - freq # convert IF 2 to sky frequency
 #Tref_hot=np.load('Tref_hot.npy') # DUT output measured noise tempeature for hot load (K)
-Pout_hot=np.load(band+'/'+band+'_'+meas+'_hot.npy') # DUT output noise tempeature for cold load (K)
-Pout_cold=np.load(band+'/'+band+'_'+meas+'_cold.npy') # Measured noise tempeature for calibrated hot load (K)
+Pout_hot=ll.LazyArray(band+'/'+band+'_'+meas+'_hot.npy') # DUT output noise tempeature for cold load (K)
+Pout_cold=ll.LazyArray(band+'/'+band+'_'+meas+'_cold.npy') # Measured noise tempeature for calibrated hot load (K)
 
 numPoints=len(freq)
 
@@ -60,43 +66,15 @@ numPoints=len(freq)
 #Calculate Tref_hot
 #Tref_hot=T0*10**(ENR/10)-1
 Tref_hot=273.15 + temp_hot_load_degrees_C # measured temperature in celcius + 273.15 
-attenG=10**(atten/10)
-attenT=T0*(1-attenG)/attenG
-#Conversions
-
-
-# Average data
-avePout_hot=np.zeros(numPoints,dtype=float)
-avePout_cold=np.zeros(numPoints,dtype=float)
-Y=np.zeros(numPoints,dtype=float)
-measTeff=np.zeros(numPoints,dtype=float)
-dutG=np.zeros(numPoints,dtype=float)
-dutT=np.zeros(numPoints,dtype=float)
-
-i=0
-for i in range (0,numPoints):
-   avePout_hot[i]=np.average(Pout_hot[:,i])   #Calculate average Pout_hot
-   avePout_cold[i]=np.average(Pout_cold[:,i])   #Calculate average Tref_hot
-
-aveTout_hot=((avePout_hot))/(k*Rbw) # Calculate measured output temperature
-aveTout_cold=((avePout_cold))/(k*Rbw) # Calculate measured output temperature
-
-
-#Method as described in (EA-MK-000-DREP-09_2)
-i=0
-for i in range (0,numPoints):
-    Y[i]=avePout_hot[i]/avePout_cold[i] # Calculate Y over frequency
-    measTeff[i]=(Tref_hot-Tref_cold*Y[i])/(Y[i]-1) # measured effective temperature
-#    Te_sa=(Th-Y_sa*Tc)/(Y_sa-1)
-    dutT[i]=measTeff[i]*attenG-attenT*attenG
-    dutG[i]=(aveTout_hot[i]-aveTout_cold[i])/(Tref_hot*attenG-Tref_cold) #Gain calculation
-
-NF=10*np.log10((dutT/290)+1) # Convert to noise figure (dB)
-dutG_dB=10*np.log10(dutG)-atten# Convert linear gain to dB
-    
-#Convert to power
-Po_hot_dB=10*np.log10(avePout_hot/1e-3) 
-Po_cold_dB=10*np.log10(avePout_cold/1e-3)
+#Method as described in (EA-MK-000-DREP-09_2), all frequency bins in one array pass
+result = rc.y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw) # cached, recomputed only if the data or settings change
+dutT = result['dutT'] # DUT noise temperature (K)
+dutG_dB = result['dutG_dB'] # Gain (dB)
+NF = result['NF'] # Noise figure (dB)
+Po_hot_dB = result['Po_hot_dB'] # Averaged power (dBm)
+Po_cold_dB = result['Po_cold_dB']
+print('%i hot and %i cold samples rejected as outliers in the sweep average'
+      % (ra.rejected_count(result['rejected_hot']), ra.rejected_count(result['rejected_cold'])))
 
 
 #%%
@@ -105,9 +83,15 @@ Po_cold_dB=10*np.log10(avePout_cold/1e-3)
 ###-----------------------------------------------------------------------------#
 ##
 
-# varables used to trim data down
-data_s = 200
-data_f = 264
+# varables used to trim data down (found by IF frequency, so any point count or a stitched grid works)
+data_s = np.searchsorted(freq, 568e6)
+data_f = np.searchsorted(freq, 632e6)
+ci = None # no intervals from block averages (captured with averaging_blocks), they are not sweeps
+if not (Pout_hot.averaging or Pout_cold.averaging):
+    ci = rc.bootstrap_y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw, window=(data_s, data_f),
+                               result=result) # intervals from resampled sweeps, cached as result
+    print('Mean Teff = %.2f K (%.2f to %.2f K), mean gain = %.2f dB (%.2f to %.2f dB), %g percent bootstrap intervals'
+          % (ci['band']['dutT'] + ci['band']['dutG_dB'] + (100*ci['confidence'],)))
 
 #upconverted = 5749-(freq/1e6)
 
@@ -159,16 +143,13 @@ def plot_ripple():
     plt.clf()    
     
     
-    z = np.polyfit(freq[data_s:data_f]/1e6,
-               dutG_dB[data_s:data_f],
-               1)
-    p = np.poly1d(z)
+    fit = gf.line_fit(freq[data_s:data_f]/1e6, dutG_dB[data_s:data_f])
 
     plt.plot(skyfreq[data_s:data_f]/1e6,
-             p(freq[data_s:data_f]/1e6)-(dutG_dB[data_s:data_f]),
+             fit['fit']-(dutG_dB[data_s:data_f]),
              color='orange',
              alpha = 0.8,
-             label=' peak to peak gain ripple = %2.2f dB' %(np.max(p(freq[data_s:data_f]/1e6)-(dutG_dB[data_s:data_f]))+np.max((dutG_dB[data_s:data_f])-p(freq[data_s:data_f]/1e6))))
+             label=' peak to peak gain ripple = %2.2f dB' %(fit['ripple']))
     
 #    plt.plot(5982+freq/1e6,
 #          (dutG_dB),
@@ -212,6 +193,9 @@ def plot_DUTTeff():
     plt.figure(2)
     plt.clf()
     plt.plot(skyfreq/1e6,dutT, linewidth=1,color='b', label='Measured Noise Temperature')
+    if ci is not None:
+        plt.fill_between(skyfreq/1e6,ci['dutT_low'],ci['dutT_high'],color='b',alpha=0.3,linewidth=0,
+                         label='%g percent bootstrap interval'%(100*ci['confidence']))
     # plt.plot([4981-32,4981+32],[125,125], linewidth=1,color='r', label='Specification = 125 K')
     plt.fill([4981-32,4981-32,4981+32,4981+32],[125,140,140,125],
               color='red',
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Allan deviation of receiver power series, to find the integration time beyond which averaging
+stops helping (gain drift takes over from radiometer noise).
+
+The series is normalised to fractional power y = P/mean(P) - 1 and summed once (X = cumsum(y));
+the overlapping Allan variance for an averaging factor m is then one vector expression over all
+samples and channels:
+    AVAR(m) = sum_k (X[k+2m] - 2X[k+m] + X[k])^2 / (2 m^2 (N - 2m + 1))
+The non-overlapping estimate uses every m-th k. Only the list of tau values is looped over (a few
+per decade). Channels are any trailing axes: frequency bins of a sweeps x bins spectra stack,
+window or span columns of a gain_stability series, or several chains at once.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import json
+import os
+
+import numpy as np
+
+import lazy_loader as ll
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+PER_DECADE = 10  # tau values per decade
+MIN_AVERAGES = 8  # independent averages needed before a tau is trusted for the optimum
+BLOCK_ELEMENTS = 2**24  # samples x channels processed at once (bounds the temporaries to ~128 MB each)
+
+
+#%%
+def averaging_factors(numSamples, per_decade=PER_DECADE):
+    """Log spaced averaging factors m from 1 up to the largest with at least one difference."""
+    m_max = numSamples//2
+    if m_max < 1:
+        raise ValueError('At least 2 samples are needed, got %i' % numSamples)
+    return np.unique(np.logspace(0, np.log10(m_max), int(np.log10(m_max)*per_decade) + 1).astype(int))
+
+
+def allan_deviation(series, dt=1.0, m=None, overlapping=True, normalise=True):
+    """Allan deviation along axis 0 of series (samples x channels...), sampled every dt s.
+    With normalise the series is taken as power and the deviation is fractional.
+    Returns (tau in s, deviation with shape (len(tau),) + channel shape, number of differences).
+    A LazyArray of on-instrument block averages is refused, see sweep_stack."""
+    ll.check_sweeps(series, 'the Allan deviation')
+    series = np.asarray(series, dtype=float)
+    numSamples = series.shape[0]
+    y = series.reshape(numSamples, -1)
+    m = averaging_factors(numSamples) if m is None else np.asarray(m, dtype=int)
+    adev = np.zeros((len(m), y.shape[1]))
+    count = np.array([len(range(0, numSamples + 1 - 2*mj, 1 if overlapping else mj)) for mj in m])
+    block = max(BLOCK_ELEMENTS//numSamples, 1)
+    for c in range(0, y.shape[1], block):
+        yc = y[:, c:c+block]
+        if normalise:
+            yc = yc/np.mean(yc, axis=0) - 1
+        X = np.zeros((numSamples + 1, yc.shape[1]))
+        np.cumsum(yc, axis=0, out=X[1:])
+        for j, mj in enumerate(m):
+            step = 1 if overlapping else mj
+            d = X[2*mj::step] - 2*X[mj:numSamples+1-mj:step] + X[:numSamples+1-2*mj:step]
+            adev[j, c:c+block] = np.sqrt(np.einsum('ij,ij->j', d, d)/(2.0*mj**2*count[j]))
+    return m*dt, adev.reshape((len(m),) + series.shape[1:]), count
+
+
+def optimal_tau(tau, adev, max_tau=None):
+    """Integration time (s) with the lowest Allan deviation, per channel. Only tau <= max_tau is
+    considered, e.g. the run length/MIN_AVERAGES, since the longest tau have too few averages."""
+    n = len(tau) if max_tau is None else max(np.searchsorted(tau, max_tau, side='right'), 1)
+    return tau[np.argmin(adev[:n], axis=0)]
+
+
+def sweep_interval(name):
+    """Median time between sweeps (s) from the <name>_telemetry.json of a capture."""
+    with open(name + '_telemetry.json') as f:
+        timestamps = np.array(json.load(f)['sweeps'])[:, 1].astype(float)
+    return float(np.median(np.diff(np.sort(timestamps))))
+
+
+def sweep_stack(name):
+    """Name of the individual sweeps of the capture <name>.npy: <name> itself, or the raw sweeps
+    kept with an on-instrument averaged capture. Raises ValueError if only block averages exist."""
+    info = ll.averaging(name + '.npy')
+    if info is None:
+        return name
+    if not info.get('raw_file'):
+        raise ValueError('%s.npy holds averages of %i sweeps and no raw sweeps were kept'
+                         % (name, info['sweeps_per_block']))
+    return os.path.join(os.path.dirname(name), info['raw_file'][:-len('.npy')])
+
+
+def window_series(Pout, data_s, data_f):
+    """Band integrated series of a sweeps x bins power stack (mean over bins data_s:data_f)."""
+    return np.mean(Pout[:, data_s:data_f], axis=1)
+
+
+def plot_allan(tau, adev, labels, title, filename=None, fig_number=5, max_tau=None):
+    """Allan deviation plot in the style of the analysis scripts' plot_Power, with the ideal
+    radiometer slope (tau^-1/2) through the first point of the first channel. The legend gives
+    the optimal_tau of every channel."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(fig_number)
+    plt.clf()
+    adev = adev.reshape(len(tau), -1)
+    best = optimal_tau(tau, adev, max_tau)
+    for j, label in enumerate(labels):
+        plt.loglog(tau, adev[:, j], linewidth=1, label='%s (minimum at %.3g s)' % (label, best[j]))
+    plt.loglog(tau, adev[0, 0]*np.sqrt(tau[0]/tau), linewidth=1, color='black', linestyle='--',
+               label='radiometer noise only')
+    plt.legend(loc='best')
+    plt.title(title)
+    plt.xlabel("Integration time (s)")
+    plt.ylabel("Allan deviation (fractional power)")
+    plt.grid(which='both', color='black', linestyle='-', linewidth=0.5, alpha=0.5)
+    fig = plt.gcf()
+    fig.set_size_inches(8, 6, forward=True)
+    if filename:
+        fig.savefig(filename, dpi=200)
+    return fig
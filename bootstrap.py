@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Bootstrap confidence intervals for the Y-factor noise temperature (dutT) and gain (dutG_dB).
+
+Each bootstrap replicate redraws the hot and the cold sweeps with replacement. The same draw is
+used for every frequency bin, so the correlation between bins is kept and the band averages come
+out right. A replicate's sweep mean is a weighted sum of the sweeps, with weights = draw count /
+number of sweeps, so all N_BOOT replicates of a block of bins take one matrix product per load:
+    avePout (N_BOOT, bins) = weights (N_BOOT, sweeps) @ Pout (sweeps, bins)
+y_factor_from_means then gives dutT and dutG_dB for every replicate and bin in one pass. The
+intervals are percentiles of the replicates. Samples rejected by the robust sweep average of
+y_factor are left out of every replicate (weights @ (Pout x kept) / weights @ kept). The bins are
+processed in blocks that keep the replicate arrays below CHUNK_BYTES; a block's data is read only
+when the block is processed. With workers > 1 the blocks go to a process pool, at most 2 x workers
+of them in flight.
+
+Pass the y_factor result the script already has (result=, with its rejection masks) so the
+estimate is not recomputed, and go through result_cache.bootstrap_y_factor to keep the intervals
+between runs.
+
+window=(data_s, data_f) also gives intervals for the band averages over that window (mean dutT
+and mean dutG_dB, as printed by the analysis scripts).
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import lazy_loader as ll
+import y_factor as yf
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+N_BOOT = 2000  # bootstrap replicates
+CONFIDENCE = 0.95  # two sided interval
+SEED = 1  # fixed, so a re-run draws the same replicates and plots the same intervals
+CHUNK_BYTES = 2**27  # replicate arrays per block of bins (128 MB)
+RESULT_ARRAYS = 12  # (replicates, bins) arrays of y_factor_from_means output and temporaries
+PRODUCTS = ('dutT', 'dutG_dB')
+
+
+#%%
+def resample_weights(numSweeps, n_boot=N_BOOT, rng=None):
+    """(n_boot, numSweeps) weights: times each sweep is drawn in a replicate / numSweeps."""
+    rng = np.random.default_rng(SEED if rng is None else rng)
+    return rng.multinomial(numSweeps, np.full(numSweeps, 1.0/numSweeps), size=n_boot)/float(numSweeps)
+
+
+def _resampled_mean(weights, Pout, rejected):
+    """(replicates, bins) sweep means, leaving out rejected samples where there are any."""
+    if rejected is None or not rejected.any():
+        return weights @ Pout
+    kept = (~rejected).astype(float)
+    return (weights @ (Pout*kept))/(weights @ kept)
+
+
+def _bootstrap_block(Pout_hot, Pout_cold, rejected_hot, rejected_cold, weights_hot, weights_cold,
+                     Tref_hot, Tref_cold, atten, Rbw, quantiles, window):
+    """Per bin quantiles of the replicates of one block of bins, and the replicate sums over the
+    window bins of the block (a slice into the block)."""
+    with np.errstate(divide='ignore', invalid='ignore'):  # replicates with Y = 1 occur out of band
+        result = yf.y_factor_from_means(_resampled_mean(weights_hot, Pout_hot, rejected_hot),
+                                        _resampled_mean(weights_cold, Pout_cold, rejected_cold),
+                                        Tref_hot, Tref_cold, atten, Rbw, PRODUCTS)
+    limits = dict((key, np.quantile(result[key], quantiles, axis=0)) for key in PRODUCTS)
+    sums = dict((key, np.sum(result[key][:, window], axis=1)) for key in PRODUCTS)
+    return limits, sums
+
+
+def _block_tasks(Pout_hot, Pout_cold, estimate, weights_hot, weights_cold, Tref_hot, Tref_cold, atten, Rbw,
+                 quantiles, window, step):
+    """Arguments of _bootstrap_block for each block of bins, read block by block as they are needed."""
+    numPoints = Pout_hot.shape[1]
+    data_s, data_f = window
+    rejected_hot, rejected_cold = estimate.get('rejected_hot'), estimate.get('rejected_cold')
+    for start in range(0, numPoints, step):
+        stop = min(start + step, numPoints)
+        yield (np.asarray(Pout_hot[:, start:stop], dtype=float), np.asarray(Pout_cold[:, start:stop], dtype=float),
+               None if rejected_hot is None else rejected_hot[:, start:stop],
+               None if rejected_cold is None else rejected_cold[:, start:stop],
+               weights_hot, weights_cold, Tref_hot, Tref_cold, atten, Rbw, quantiles,
+               slice(max(data_s - start, 0), max(min(data_f, stop) - start, 0)))
+
+
+def bootstrap_y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, window=None,
+                       n_boot=N_BOOT, confidence=CONFIDENCE, seed=SEED, chunk_bytes=CHUNK_BYTES, workers=1,
+                       estimator=None, result=None):
+    """Bootstrap intervals of dutT and dutG_dB from hot and cold sweep stacks (sweeps, bins) in W
+    (arrays or lazy_loader.LazyArray). Returns a dict with the estimate and the lower and upper
+    limits per bin ('dutT', 'dutT_low', 'dutT_high', ...), and with a window, 'band' with
+    (estimate, low, high) of the window average of each product. result is the y_factor result of
+    the same stacks and parameters; without it y_factor is run with estimator (robust_average).
+    Samples rejected by the sweep average are left out of every replicate. Stacks of on-instrument
+    block averages (lazy_loader.averaging) are refused: resampling needs individual sweeps."""
+    ll.check_sweeps(Pout_hot, 'the bootstrap')
+    ll.check_sweeps(Pout_cold, 'the bootstrap')
+    numPoints = Pout_hot.shape[1]
+    if Pout_cold.shape[1] != numPoints:
+        raise ValueError('Hot and cold stacks have %i and %i points' % (numPoints, Pout_cold.shape[1]))
+    estimate = result if result is not None else yf.y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw,
+                                                             estimator=estimator)
+    rng = np.random.default_rng(seed)
+    weights_hot = resample_weights(Pout_hot.shape[0], n_boot, rng)
+    weights_cold = resample_weights(Pout_cold.shape[0], n_boot, rng)
+    quantiles = [(1 - confidence)/2, (1 + confidence)/2]
+    data_s, data_f = (0, 0) if window is None else window
+    step = max(chunk_bytes//(n_boot*8*RESULT_ARRAYS), 1)
+    tasks = _block_tasks(Pout_hot, Pout_cold, estimate, weights_hot, weights_cold, Tref_hot, Tref_cold, atten, Rbw,
+                         quantiles, (data_s, data_f), step)
+    if workers > 1 and numPoints > step:
+        outputs = []
+        with ProcessPoolExecutor(workers) as pool:
+            pending = collections.deque()
+            for task in tasks:
+                pending.append(pool.submit(_bootstrap_block, *task))
+                if len(pending) >= 2*workers:
+                    outputs.append(pending.popleft().result())
+            outputs.extend(future.result() for future in pending)
+    else:
+        outputs = [_bootstrap_block(*task) for task in tasks]
+
+    intervals = {'n_boot': n_boot, 'confidence': confidence}
+    for key in PRODUCTS:
+        limits = np.concatenate([limits[key] for limits, sums in outputs], axis=1)
+        intervals[key] = estimate[key]
+        intervals[key + '_low'], intervals[key + '_high'] = limits
+    if window is not None:
+        intervals['band'] = {}
+        for key in PRODUCTS:
+            band = sum(sums[key] for limits, sums in outputs)/(data_f - data_s)
+            low, high = np.quantile(band, quantiles)
+            intervals['band'][key] = (float(np.mean(estimate[key][data_s:data_f])), float(low), float(high))
+    return intervals
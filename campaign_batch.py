@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Batch Y-factor processing of every chain of every campaign, instead of one analysis script run
+per chain.
+
+Each campaign directory has a campaign.json with the settings the analysis scripts set by hand:
+Tref_cold, atten, Rbw and the analysis window in IF, and per chain the measurement name (meas)
+and Tref_hot. A chain entry may also be a list of measurements. load_campaigns turns these files
+into Measurement objects.
+
+CampaignBatch groups the measurements by point count; sweep counts may differ. The hot (then
+cold) stacks of one shape are read with ragged_stack into one reused buffer, up to STACK_BYTES at
+a time, and averaged over the sweeps in one robust_average call, so the per stack overhead of the
+estimator is paid once per chunk. Teff, gain, NF and power of the whole group are then one
+y_factor pass, with the parameters as arrays over the measurements. With a single point count,
+grid() gives the products as (campaign, chain, bins). Only the means are kept, not the stacks:
+the bootstrap and the sweep statistics still read one measurement at a time. The reads go to a
+thread pool only for POOL_BYTES of data or more; below that the pool costs more than it saves.
+
+compute(dtype=np.float32) does the Y-factor arithmetic and keeps the products in float32, checked
+against float64 as in y_factor. Stacks stored as float32 are read at their stored precision.
+
+    python campaign_batch.py   # every campaign.json below the repository root, with benchmarks
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import glob
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import lazy_loader as ll
+import robust_average as ra
+import y_factor as yf
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+CAMPAIGN_FILE = 'campaign.json'
+CHUNK_BYTES = 2**28  # y_factor temporaries per pass (256 MB)
+STACK_BYTES = 2**24  # stacks read and averaged per call (16 MB, the buffer stays in cache)
+RESULT_ARRAYS = 12  # arrays of y_factor_from_means output and temporaries, for the pass size
+PRODUCTS = ('dutT', 'dutG_dB', 'NF', 'Po_hot_dB', 'Po_cold_dB')  # per bin results kept for every measurement
+WORKERS = 4  # file reads in flight
+POOL_BYTES = 2**26  # below this much stored data (64 MB) the reads stay in the calling thread
+SYNTHETIC = ((8, 8, 20, 801), (32, 8, 20, 801), (8, 8, 200, 8001))  # benchmark campaigns, chains, sweeps, points
+
+
+#%%
+class Measurement(object):
+    """One hot/cold Y-factor measurement: <directory>/<band>/<band>_<meas>_hot.npy and _cold.npy
+    with the frequency axis in <directory>/<band>/DUTfreq.npy."""
+
+    def __init__(self, campaign, directory, band, meas, Tref_hot, Tref_cold=10.7, atten=0.0, Rbw=2e6,
+                 window_IF=None):
+        self.campaign = campaign
+        self.directory = directory
+        self.band = band
+        self.meas = meas
+        self.Tref_hot = Tref_hot
+        self.Tref_cold = Tref_cold
+        self.atten = atten
+        self.Rbw = Rbw
+        self.window_IF = window_IF  # (start, stop) in Hz, None for the whole span
+        self.name = os.path.join(directory, band, band + '_' + meas)
+        self.freq_file = os.path.join(directory, band, 'DUTfreq.npy')
+
+    def files(self):
+        return self.name + '_hot.npy', self.name + '_cold.npy'
+
+    def exists(self):
+        return all(os.path.exists(f) for f in self.files() + (self.freq_file,))
+
+    def window(self, freq):
+        """Analysis window (data_s, data_f) on freq."""
+        if self.window_IF is None:
+            return 0, len(freq)
+        return tuple(int(i) for i in np.searchsorted(freq, self.window_IF))
+
+
+def load_campaigns(pattern='*/' + CAMPAIGN_FILE, verbose=True):
+    """Measurements of every campaign.json matching pattern, skipping those without data files."""
+    measurements = []
+    for path in sorted(glob.glob(pattern)):
+        directory = os.path.dirname(path)
+        with open(path) as f:
+            campaign = json.load(f)
+        for band, chain in sorted(campaign['chains'].items()):
+            for entry in (chain if isinstance(chain, list) else [chain]):
+                settings = dict(campaign, **entry)
+                m = Measurement(campaign['campaign'], directory, band, settings['meas'], settings['Tref_hot'],
+                                settings['Tref_cold'], settings['atten'], settings['Rbw'],
+                                settings.get('window_IF', {}).get(band[:2]))
+                if m.exists():
+                    measurements.append(m)
+                elif verbose:
+                    print('%s %s: no data for %s' % (m.campaign, band, m.meas))
+    return measurements
+
+
+def _read_into(path, out, header=None):
+    """Read a .npy straight into out, converting only if it is not native float64 in C order."""
+    shape, dtype, fortran_order, offset = header or ll.npy_header(path)
+    if dtype == out.dtype and not fortran_order and shape == out.shape:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            if f.readinto(memoryview(out).cast('B')) != out.nbytes:
+                raise IOError('%s is shorter than its header says' % path)
+    else:
+        out[...] = np.load(path, mmap_mode='r')
+
+
+def sweep_means(files, headers, out, pool=None, estimator=ra.ESTIMATOR, rejected=None, stack_bytes=STACK_BYTES,
+                buffers=None):
+    """Sweep average of every file into the rows of out (len(files), bins). Files of one shape,
+    stored precision and estimator (robust_average.stack_estimator) are read with ragged_stack,
+    up to stack_bytes at a time, and averaged in one robust_average call; reads run in pool if
+    given. buffers ({dtype: flat array}) keeps the read buffers across calls. The number of
+    rejected samples per file goes into rejected, if given."""
+    buffers = {} if buffers is None else buffers
+    groups = {}
+    for i, (path, header) in enumerate(zip(files, headers)):
+        key = (header[0], header[1], ra.stack_estimator(ll.LazyArray(path), estimator))
+        groups.setdefault(key, []).append(i)
+    for (shape, dtype, stack_estimator), index in groups.items():
+        step = max(stack_bytes//(dtype.itemsize*int(np.prod(shape))), 1)
+        for start in range(0, len(index), step):
+            rows = index[start:start+step]
+            size = len(rows)*int(np.prod(shape))
+            if dtype not in buffers or buffers[dtype].size < size:
+                buffers[dtype] = np.empty(size, dtype=dtype)
+            stack = ragged_stack([files[i] for i in rows], pool, [headers[i] for i in rows], buffers[dtype][:size])[0]
+            out[rows], mask = ra.sweep_average(stack.reshape((len(rows),) + shape), stack_estimator)
+            if rejected is not None:
+                rejected[rows] = 0 if mask is None else np.count_nonzero(mask, axis=(1, 2))
+    return out
+
+
+def ragged_stack(files, pool=None, headers=None, out=None):
+    """All sweeps of the (sweeps, bins) files in one (total sweeps, bins) array, the ragged form of
+    a (measurement, sweep, bin) stack, read in pool if given. out is a flat buffer to read into
+    (float64 by default). Returns (stack, start row of every file)."""
+    headers = headers or [ll.npy_header(f) for f in files]
+    if len(set(header[0][1] for header in headers)) > 1:
+        raise ValueError('Files with different point counts cannot share a stack')
+    counts = np.array([header[0][0] for header in headers], dtype=int)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+    shape = (int(np.sum(counts)), headers[0][0][1])
+    stack = np.empty(shape) if out is None else out[:shape[0]*shape[1]].reshape(shape)
+    jobs = [(f, stack[o:o+n], header) for f, o, n, header in zip(files, offsets, counts, headers)]
+    list(pool.map(lambda job: _read_into(*job), jobs) if pool else (_read_into(*job) for job in jobs))
+    return stack, offsets
+
+
+class CampaignBatch(object):
+    """Y-factor products of many measurements, computed per point count in a few array passes."""
+
+    def __init__(self, measurements):
+        self.measurements = list(measurements)
+        self.sweeps = np.zeros((len(self.measurements), 2), dtype=int)  # hot, cold sweeps
+        self.groups = {}  # numPoints: [measurement index, ...]
+        self.headers = [tuple(ll.npy_header(f) for f in m.files()) for m in self.measurements]  # hot, cold
+        for i, m in enumerate(self.measurements):
+            hot_shape, cold_shape = (header[0] for header in self.headers[i])
+            if hot_shape[1] != cold_shape[1]:
+                raise ValueError('%s: hot and cold have %i and %i points' % (m.name, hot_shape[1], cold_shape[1]))
+            self.sweeps[i] = [(ll.averaging(f) or {}).get('sweeps', header[0][0])
+                              for f, header in zip(m.files(), self.headers[i])]  # sweeps, also when block averaged
+            self.groups.setdefault(hot_shape[1], []).append(i)
+        self.location = {}  # measurement index: (numPoints, row in the group's arrays)
+        for numPoints, index in self.groups.items():
+            self.location.update((i, (numPoints, row)) for row, i in enumerate(index))
+        self.freq = {}  # numPoints: (measurements, numPoints) frequency axes
+        self.results = {}  # numPoints: {product: (measurements, numPoints)}
+        self.windows = np.zeros((len(self.measurements), 2), dtype=int)
+        self.rejected = np.zeros((len(self.measurements), 2), dtype=int)  # hot, cold samples rejected
+
+    def compute(self, chunk_bytes=CHUNK_BYTES, workers=WORKERS, dtype=float, check=True, estimator=ra.ESTIMATOR):
+        """Read every measurement once and fill freq, results, windows and rejected. Returns self.
+        estimator is the robust_average sweep average, as in y_factor. The reads run in a pool of
+        workers threads only when the stacks add up to POOL_BYTES or more.
+        dtype is the precision of the Y-factor arithmetic and the products (np.float32 halves
+        their memory); below float64 each pass is checked with y_factor.check_precision."""
+        size = sum(int(np.prod(header[0]))*header[1].itemsize for headers in self.headers for header in headers)
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 and size >= POOL_BYTES else None
+        buffers = {}
+        try:
+            for numPoints, index in self.groups.items():
+                ms = [self.measurements[i] for i in index]
+                avePout = np.empty((2, len(index), numPoints))  # hot, cold
+                for j in (0, 1):
+                    rejected = np.zeros(len(index), dtype=int)
+                    sweep_means([m.files()[j] for m in ms], [self.headers[i][j] for i in index], avePout[j], pool,
+                                estimator, rejected, buffers=buffers)
+                    self.rejected[index, j] = rejected
+                freq = np.empty((len(index), numPoints))
+                for row, (i, m) in enumerate(zip(index, ms)):
+                    _read_into(m.freq_file, freq[row])
+                    self.windows[i] = m.window(freq[row])
+                Tref_hot, Tref_cold, atten, Rbw = (np.array([getattr(m, p) for m in ms], dtype=float)
+                                                   for p in ('Tref_hot', 'Tref_cold', 'atten', 'Rbw'))
+                products = {key: np.empty((len(index), numPoints), dtype=dtype) for key in PRODUCTS}
+                step = max(chunk_bytes//(numPoints*8*RESULT_ARRAYS), 1)
+                for r in range(0, len(index), step):
+                    rows = slice(r, r + step)
+                    parameters = (Tref_hot[rows], Tref_cold[rows], atten[rows], Rbw[rows])
+                    result = yf.y_factor_from_means(avePout[0, rows].astype(dtype, copy=False),
+                                                    avePout[1, rows].astype(dtype, copy=False), *parameters)
+                    if check and np.dtype(dtype) != np.float64:
+                        yf.check_precision(result, avePout[0, rows], avePout[1, rows], *parameters,
+                                           bins=slice(None, None, yf.CHECK_STRIDE))
+                    for key in PRODUCTS:
+                        products[key][rows] = result[key]
+                self.freq[numPoints] = freq
+                self.results[numPoints] = products
+        finally:
+            if pool:
+                pool.shutdown()
+        return self
+
+    def result(self, i):
+        """(freq, {product: per bin array}) of measurement i."""
+        numPoints, row = self.location[i]
+        return self.freq[numPoints][row], {key: self.results[numPoints][key][row] for key in PRODUCTS}
+
+    def band_average(self, key):
+        """Mean of product key over each measurement's analysis window (NaN outside it is ignored)."""
+        average = np.zeros(len(self.measurements))
+        for numPoints, index in self.groups.items():
+            data_s, data_f = self.windows[index, 0:1], self.windows[index, 1:2]
+            bins = np.arange(numPoints)
+            inside = (bins >= data_s) & (bins < data_f)
+            average[index] = (np.sum(np.where(inside, self.results[numPoints][key], 0), axis=1)
+                              / np.maximum(data_f[:, 0] - data_s[:, 0], 1))
+        return average
+
+    def grid(self, key):
+        """Product key as (campaign, chain, bins), NaN for chains a campaign does not have.
+        Returns (campaigns, bands, array). Needs a single point count and one measurement per chain."""
+        if len(self.groups) != 1:
+            raise ValueError('Measurements have %i different point counts, use result()' % len(self.groups))
+        campaigns = sorted(set(m.campaign for m in self.measurements))
+        bands = sorted(set(m.band for m in self.measurements))
+        numPoints, index = list(self.groups.items())[0]
+        out = np.full((len(campaigns), len(bands), numPoints), np.nan)
+        for row, i in enumerate(index):
+            m = self.measurements[i]
+            out[campaigns.index(m.campaign), bands.index(m.band)] = self.results[numPoints][key][row]
+        return campaigns, bands, out
+
+    def summary(self):
+        """Print and return (campaign, band, meas, hot sweeps, cold sweeps, Teff K, gain dB) per
+        measurement, averaged over the analysis window."""
+        teff = self.band_average('dutT')
+        gain = self.band_average('dutG_dB')
+        rows = [(m.campaign, m.band, m.meas, int(self.sweeps[i, 0]), int(self.sweeps[i, 1]), teff[i], gain[i])
+                for i, m in enumerate(self.measurements)]
+        print('%-18s %-6s %-28s %5s %5s %9s %9s' % ('campaign', 'chain', 'meas', 'hot', 'cold', 'Teff (K)', 'gain (dB)'))
+        for row in rows:
+            print('%-18s %-6s %-28s %5i %5i %9.2f %9.2f' % row)
+        return rows
+
+
+def sequential_y_factor(measurements):
+    """One measurement after the other, as the analysis scripts do: load DUTfreq and the hot and
+    cold stacks, then y_factor. Returns [(freq, result), ...]."""
+    out = []
+    for m in measurements:
+        freq = np.load(m.freq_file)
+        Pout_hot, Pout_cold = (np.load(f) for f in m.files())
+        out.append((freq, yf.y_factor(Pout_hot, Pout_cold, m.Tref_hot, m.Tref_cold, m.atten, m.Rbw)))
+    return out
+
+
+def synthetic_campaigns(directory, campaigns, chains, sweeps, numPoints, dtype=np.float32, seed=0):
+    """Write campaigns x chains measurements of Gaussian noise hot and cold stacks (sweeps,
+    numPoints) with their campaign.json files below directory, for benchmarks at scale. Returns
+    the measurements."""
+    rng = np.random.default_rng(seed)
+    freq = np.linspace(500e6, 1000e6, numPoints)
+    bands = ['B%iLCP' % (chain + 1) for chain in range(chains)]
+    for campaign in range(campaigns):
+        path = os.path.join(directory, 'synthetic %03i' % campaign)
+        for band in bands:
+            os.makedirs(os.path.join(path, band))
+            np.save(os.path.join(path, band, 'DUTfreq.npy'), freq)
+            for load, level in (('hot', 2e-9), ('cold', 1e-9)):
+                Pout = level*(1 + 0.05*rng.standard_normal((sweeps, numPoints)))
+                np.save(os.path.join(path, band, '%s_synthetic_%s.npy' % (band, load)), Pout.astype(dtype))
+        with open(os.path.join(path, CAMPAIGN_FILE), 'w') as f:
+            json.dump({'campaign': 'synthetic %03i' % campaign, 'Tref_cold': 10.7, 'atten': 0.0, 'Rbw': 2e6,
+                       'chains': dict((band, {'meas': 'synthetic', 'Tref_hot': 300.0}) for band in bands)}, f)
+    return load_campaigns(os.path.join(directory, '*', CAMPAIGN_FILE))
+
+
+def benchmark_batch(measurements, repeat=5, chunk_bytes=CHUNK_BYTES, workers=WORKERS, dtype=float, label=''):
+    """Best of repeat times for the sequential, per script route and for CampaignBatch."""
+    timings = {}
+    for name, run in (('sequential', lambda: sequential_y_factor(measurements)),
+                      ('batch', lambda: CampaignBatch(measurements).compute(chunk_bytes, workers, dtype))):
+        best = np.inf
+        for r in range(repeat):
+            t0 = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - t0)
+        timings[name] = best
+    print('%s%i measurements: sequential %.1f ms, batch %.1f ms (%.1fx)'
+          % (label, len(measurements), timings['sequential']*1e3, timings['batch']*1e3,
+             timings['sequential']/timings['batch']))
+    return timings
+
+
+#%%
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    measurements = load_campaigns()
+    CampaignBatch(measurements).compute().summary()
+    benchmark_batch(measurements)
+    for campaigns, chains, sweeps, numPoints in SYNTHETIC:
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark_batch(synthetic_campaigns(directory, campaigns, chains, sweeps, numPoints), repeat=3,
+                            label='synthetic %i x %i float32: ' % (sweeps, numPoints))
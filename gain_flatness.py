@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Gain slope and peak to peak ripple of every sub-band window of every chain, instead of one
+np.polyfit per plot over the hard-coded analysis window.
+
+The least squares line through the points of a window needs only the window sums of x, y, x*x and
+x*y:
+    slope = (Sxy - Sx*Sy/n)/(Sxx - Sx*Sx/n),  intercept = (Sy - slope*Sx)/n
+Each window sum is the difference of two cumulative sums, so window_fits fits every window of n
+points at every offset with four cumsums over the bins, whatever n is. x and y are centred first
+to keep the differences of large sums exact. Leading axes of y (chains, campaigns, measurements)
+are fitted in the same pass. Windows with a NaN or inf gain get NaN.
+
+The ripple is max(fit - y) + max(y - fit) over the window, as in the plot labels. A running max
+does not decompose into sums, so the residuals of the windows are formed in blocks of at most
+CHUNK_BYTES from a sliding view of the bins, one array pass per block.
+
+scan returns a table (numpy structured array, one row per chain, width and offset) of windows
+WIDTHS wide in MHz; batch_scan scans every measurement of a campaign_batch.CampaignBatch.
+
+    fit = gf.line_fit(upconverted[data_s:data_f], dutG_dB[data_s:data_f])  # one plot window
+    table = gf.batch_scan(cb.CampaignBatch(cb.load_campaigns()).compute())
+    gf.summary(table)
+
+    python gain_flatness.py   # every campaign.json below the repository root, with a benchmark
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import os
+import time
+
+import numpy as np
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+WIDTHS = (32.0, 64.0, 128.0)  # MHz, sub-band widths scanned by default
+SLOPE_SPAN = 400.0  # MHz, the analysis scripts label the gain slope in dB per 400 MHz
+CHUNK_BYTES = 2**26  # residuals per ripple block (64 MB)
+TABLE_DTYPE = [('chain', 'U64'), ('width', float), ('points', int), ('first', int), ('start', float),
+               ('stop', float), ('slope', float), ('intercept', float), ('ripple', float)]
+
+
+#%%
+def line_fit(x, y):
+    """Least squares line through y (..., points) against x (MHz). Returns a dict with 'slope'
+    (dB/MHz), 'intercept', 'fit' (the line at x) and 'ripple' (max(fit - y) + max(y - fit))."""
+    y = np.asarray(y, dtype=float)
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    xc = x - np.mean(x, axis=-1, keepdims=True)
+    yc = y - np.mean(y, axis=-1, keepdims=True)
+    slope = np.sum(xc*yc, axis=-1)/np.sum(xc*xc, axis=-1)
+    intercept = np.mean(y, axis=-1) - slope*np.mean(x, axis=-1)
+    fit = intercept[..., np.newaxis] + slope[..., np.newaxis]*x
+    return {'slope': slope, 'intercept': intercept, 'fit': fit, 'ripple': np.ptp(y - fit, axis=-1)}
+
+
+def _window_sums(a, starts, points):
+    total = np.zeros(a.shape[:-1] + (a.shape[-1] + 1,))
+    np.cumsum(a, axis=-1, out=total[..., 1:])
+    return total[..., starts + points] - total[..., starts]
+
+
+def window_fits(x, y, points, step=1, chunk_bytes=CHUNK_BYTES):
+    """Line fits of every window of points bins of y (..., bins) against x (bins or the shape of
+    y), at offsets 0, step, 2*step, ... Returns a dict with 'first' (first bin of each window) and
+    'slope', 'intercept' and 'ripple' (..., windows), as line_fit per window."""
+    y = np.asarray(y, dtype=float)
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    numPoints = y.shape[-1]
+    if not 2 <= points <= numPoints:
+        raise ValueError('Window of %i points does not fit %i bins' % (points, numPoints))
+    starts = np.arange(0, numPoints - points + 1, step)
+    bad = ~np.isfinite(y)
+    x_mean = np.mean(x, axis=-1, keepdims=True)
+    y_mean = np.mean(np.where(bad, 0, y), axis=-1, keepdims=True)
+    xc = x - x_mean
+    yc = np.where(bad, 0, y - y_mean)
+    Sx, Sy, Sxx, Sxy = (_window_sums(a, starts, points) for a in (xc, yc, xc*xc, xc*yc))
+    slope = (Sxy - Sx*Sy/points)/(Sxx - Sx*Sx/points)
+    intercept_c = (Sy - slope*Sx)/points  # in the centred coordinates
+    ripple = np.empty(slope.shape)
+    windows_x = np.lib.stride_tricks.sliding_window_view(xc, points, axis=-1)[..., ::step, :]
+    windows_y = np.lib.stride_tricks.sliding_window_view(yc, points, axis=-1)[..., ::step, :]
+    block = max(chunk_bytes//(8*points*max(int(np.prod(y.shape[:-1])), 1)), 1)
+    for b in range(0, len(starts), block):
+        window = slice(b, b + block)
+        residual = windows_y[..., window, :] - slope[..., window, np.newaxis]*windows_x[..., window, :]
+        ripple[..., window] = np.ptp(residual, axis=-1)
+    invalid = _window_sums(bad.astype(float), starts, points) > 0
+    slope[invalid] = np.nan
+    ripple[invalid] = np.nan
+    intercept = np.where(invalid, np.nan, y_mean + intercept_c - slope*x_mean)
+    return {'first': starts, 'slope': slope, 'intercept': intercept, 'ripple': ripple}
+
+
+def scan(x, y, widths=WIDTHS, step=1, labels=None, chunk_bytes=CHUNK_BYTES):
+    """Table of the line fits of every window widths wide (in the units of x, MHz) of every row of
+    y (..., bins), at every step-th offset. x is evenly spaced and shared by the rows or has the
+    shape of y; a width covers round(width/bin spacing) bins, widths wider than the span are
+    skipped. labels name the rows of y flattened (default their index). One table row per chain,
+    width and window, in that order, with fields chain, width, points and first (bins), start and
+    stop (x of the first and last bin), slope (dB per unit of x), intercept and ripple (dB)."""
+    y = np.asarray(y, dtype=float)
+    numPoints = y.shape[-1]
+    y = y.reshape(-1, numPoints)
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape[:-1] + (numPoints,)) if np.ndim(x) == 1 \
+        else np.asarray(x, dtype=float).reshape(-1, numPoints)
+    labels = [str(i) for i in range(len(y))] if labels is None else list(labels)
+    spacing = abs(x[0, -1] - x[0, 0])/max(numPoints - 1, 1)
+    tables = []
+    for width in widths:
+        points = int(round(width/spacing))
+        if not 2 <= points <= numPoints:
+            continue
+        fits = window_fits(x, y, points, step, chunk_bytes)
+        first = fits['first']
+        table = np.zeros((len(y), len(first)), dtype=TABLE_DTYPE)
+        table['chain'] = np.asarray(labels)[:, np.newaxis]
+        table['width'] = width
+        table['points'] = points
+        table['first'] = first
+        table['start'] = x[:, first]
+        table['stop'] = x[:, first + points - 1]
+        for key in ('slope', 'intercept', 'ripple'):
+            table[key] = fits[key]
+        tables.append(table)
+    if not tables:
+        return np.zeros(0, dtype=TABLE_DTYPE)
+    return np.concatenate(tables, axis=1).ravel()  # chain major
+
+
+def batch_scan(batch, widths=WIDTHS, step=1, inside=True, chunk_bytes=CHUNK_BYTES):
+    """scan of dutG_dB against IF (MHz) for every measurement of a computed CampaignBatch, one
+    pass per point count. Chains are labelled 'campaign band meas'. With inside, only windows
+    within each measurement's analysis window are kept."""
+    tables = []
+    for numPoints, index in batch.groups.items():
+        labels = ['%s %s %s' % (m.campaign, m.band, m.meas) for m in (batch.measurements[i] for i in index)]
+        table = scan(batch.freq[numPoints]/1e6, batch.results[numPoints]['dutG_dB'], widths, step, labels,
+                     chunk_bytes)
+        if inside and len(table):
+            table = table.reshape(len(index), -1)  # scan is chain major
+            data_s, data_f = batch.windows[index, 0:1], batch.windows[index, 1:2]
+            table = table[(table['first'] >= data_s) & (table['first'] + table['points'] <= data_f)]
+        tables.append(table.ravel())
+    return np.concatenate(tables) if tables else np.zeros(0, dtype=TABLE_DTYPE)
+
+
+def summary(table):
+    """Print and return (chain, width MHz, windows, flattest window start, its ripple dB, largest
+    ripple dB, largest |slope| in dB per SLOPE_SPAN MHz) per chain and width of a scan table."""
+    rows = []
+    for chain in sorted(set(table['chain'])):
+        for width in sorted(set(table['width'][table['chain'] == chain])):
+            windows = table[(table['chain'] == chain) & (table['width'] == width) & np.isfinite(table['ripple'])]
+            if not len(windows):
+                continue
+            flattest = windows[np.argmin(windows['ripple'])]
+            rows.append((chain, width, len(windows), flattest['start'], flattest['ripple'],
+                         np.max(windows['ripple']), SLOPE_SPAN*np.max(np.abs(windows['slope']))))
+    print('%-36s %6s %7s %10s %11s %11s %11s' % ('chain', 'width', 'windows', 'flattest', 'ripple (dB)',
+                                                'worst (dB)', '|slope| (dB)'))
+    for row in rows:
+        print('%-36s %6.0f %7i %10.1f %11.2f %11.2f %11.2f' % row)
+    return rows
+
+
+def benchmark_scan(x, y, widths=WIDTHS, step=1, repeat=3):
+    """Best of repeat times for scan and for np.polyfit and the ripple of each window in turn, as
+    the analysis scripts do for their one window."""
+    y = np.asarray(y, dtype=float).reshape(-1, np.shape(y)[-1])
+    spacing = abs(x[-1] - x[0])/(len(x) - 1)
+
+    def polyfit_loop():
+        for row in y:
+            for width in widths:
+                points = int(round(width/spacing))
+                for first in range(0, len(x) - points + 1, step):
+                    xw, yw = x[first:first + points], row[first:first + points]
+                    p = np.poly1d(np.polyfit(xw, yw, 1))
+                    np.max(p(xw) - yw) + np.max(yw - p(xw))
+
+    timings = {}
+    for label, run in (('polyfit', polyfit_loop), ('scan', lambda: scan(x, y, widths, step))):
+        best = np.inf
+        for r in range(repeat):
+            t0 = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - t0)
+        timings[label] = best
+    print('%i chains x %i bins, widths %s MHz: polyfit %.1f ms, scan %.1f ms (%.0fx)'
+          % (len(y), len(x), ', '.join('%g' % w for w in widths), timings['polyfit']*1e3, timings['scan']*1e3,
+             timings['polyfit']/timings['scan']))
+    return timings
+
+
+#%%
+if __name__ == '__main__':
+    import campaign_batch as cb
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    batch = cb.CampaignBatch(cb.load_campaigns()).compute()
+    summary(batch_scan(batch))
+    numPoints, index = max(batch.groups.items(), key=lambda group: len(group[1]))
+    benchmark_scan(batch.freq[numPoints][0]/1e6, batch.results[numPoints]['dutG_dB'], repeat=1)
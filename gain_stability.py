@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Receiver gain stability capture: band integrated (total) power sampled at a fixed cadence for
+minutes to hours. Every sample is one RMS sweep reduced to the mean linear power over the band's
+analysis window and over the whole span, so only one trace is ever held in memory.
+
+Samples are written in chunks to a pre-sized memory-mapped <name>_partial.npy with a completed
+sample counter (the SweepStore scheme), so a night long run holds at most one chunk in RAM, an
+interrupted run loses at most one chunk and can be resumed. finalise() leaves <name>.npy with one
+row per sample and the COLUMNS below; the capture settings are in <name>_gain_stability.json.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import json
+import time
+
+import numpy as np
+
+import spectrum_analyser as sa
+import sweep_acquisition as acq
+import sweep_statistics as st
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+COLUMNS = ('timestamp', 'window_W', 'span_W')  # Unix time (s), mean power over the window and the span (W)
+
+
+#%%
+class TimeSeriesStore(acq.SweepStore):
+    """SweepStore for a (samples x columns) time series that is flushed to disk every chunk rows."""
+
+    def __init__(self, name, maxSamples, columns=COLUMNS, chunk=60, resume=False):
+        acq.SweepStore.__init__(self, name, maxSamples, len(columns), resume)
+        self.columns = columns
+        self.buffer = np.zeros((chunk, len(columns)))
+        self.buffered = 0
+
+    def append(self, row):
+        self.buffer[self.buffered, :] = row
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows and advance the completed-sample counter."""
+        if self.buffered:
+            self.Pout[self.completed:self.completed+self.buffered, :] = self.buffer[:self.buffered, :]
+            self.Pout.flush()
+            self.completed += self.buffered
+            self._write_count()
+            self.buffered = 0
+
+    def finalise(self):
+        """Save the samples taken (<name>.npy) and return them memory-mapped."""
+        self.flush()
+        return acq.SweepStore.finalise(self, minSweeps=1, mmap_mode='r')
+
+
+def capture_gain_stability(signal_shark, name, band, freq, cadence=1.0, duration=3600.0,
+                           transfer='binary', chunk=60, resume=False, report_every=60):
+    """Sample the band window and span power every cadence s for duration s (or until Ctrl-C)
+    into <name>.npy. freq is the trace frequency axis (Hz), used to find the band's window.
+    Samples are scheduled on a fixed grid from the start time; a sweep that takes longer than the
+    cadence delays the next sample and is counted as late. Returns the samples (memory-mapped)."""
+    data_s, data_f = st.analysis_window(band, freq=freq)
+    maxSamples = int(np.ceil(duration/cadence))
+    store = TimeSeriesStore(name, maxSamples, COLUMNS, chunk, resume)
+    with open(name + '_gain_stability.json', 'w') as f:
+        json.dump({'band': band, 'cadence_s': cadence, 'duration_s': duration, 'columns': COLUMNS,
+                   'window': [data_s, data_f], 'window_Hz': [freq[data_s], freq[data_f-1]],
+                   'span_Hz': [freq[0], freq[-1]], 'started': time.strftime('%Y-%m-%d %H:%M:%S')},
+                  f, indent=1)
+    trace = np.zeros(len(freq))
+    first = store.completed
+    late = 0
+    t0 = time.time()
+    try:
+        for i in range(first, maxSamples):
+            delay = t0 + (i - first)*cadence - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            elif i > first:
+                late += 1
+            timestamp = time.time()
+            acq.trigger_sweep(signal_shark)
+            sa.read_trace(signal_shark, trace, transfer)
+            power = 10**(trace/10)*1e-3  # Convert to linear power (W)
+            row = (timestamp, np.mean(power[data_s:data_f]), np.mean(power))
+            store.append(row)
+            if (i + 1) % report_every == 0:
+                print('%s sample # %i of %i, window power %.4e W, %i late' % (band, i+1, maxSamples, row[1], late))
+    except KeyboardInterrupt:
+        print('Stopped by the operator')
+    samples = store.finalise()
+    print('%s: %i samples at %.3f s cadence saved, %i late' % (name, samples.shape[0], cadence, late))
+    return samples
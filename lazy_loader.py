@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Lazy, memory-mapped access to the sweeps x bins power stacks (*_hot.npy, *_cold.npy, ...).
+
+Creating a LazyArray does not touch the file: the .npy header is read when the shape or dtype is
+first asked for and the file is memory-mapped when data is, so an array that is never used costs
+nothing (and need not exist). window(data_s, data_f) and
+sweeps(start, stop) narrow the view without reading anything; only the selected bin columns and
+sweeps are read later. mean() and var() over the sweeps axis stream the view in blocks of
+BLOCK_BYTES, so a capture of thousands of sweeps or tens of thousands of points is never held in
+memory. np.mean, np.var and y_factor.y_factor call these methods directly:
+
+    Pout_hot = ll.LazyArray(band+'/'+band+'_'+meas+'_hot.npy')
+    result = yf.y_factor(Pout_hot.window(data_s, data_f), Pout_cold.window(data_s, data_f), ...)
+
+Anything else (indexing, np.asarray) returns an ordinary in-memory copy of the selection.
+
+A stack captured with on-instrument averaging (sweep_acquisition.capture_averaged) has block
+averages as rows and a <name>_averaging.json sidecar with the blocks and sweeps per block.
+averaging() reads it (LazyArray.averaging for a view). Its row mean is the mean of all sweeps, but
+anything that treats the rows as individual sweeps (bootstrap, clipping, sweep to sweep variance,
+Allan deviation) calls check_sweeps and refuses it. The default screened sweep average falls back
+to the mean for one (robust_average.stack_estimator).
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import copy
+import json
+
+import numpy as np
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+BLOCK_BYTES = 2**25  # sweeps read per block by mean() and var() (32 MB)
+AVERAGING_SUFFIX = '_averaging.json'  # sidecar of a stack whose rows are on-instrument block averages
+
+
+#%%
+def npy_header(path):
+    """(shape, dtype, fortran order, data offset) from a .npy header, without reading the data."""
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        return shape, dtype, fortran_order, f.tell()
+
+
+def averaging(path):
+    """Sidecar of <name>.npy with on-instrument averaged rows ({'blocks', 'sweeps_per_block', 'sweeps',
+    'raw_sweeps', 'raw_file'}), or None for a stack of individual sweeps."""
+    name = path[:-len('.npy')] if path.endswith('.npy') else path
+    try:
+        with open(name + AVERAGING_SUFFIX) as f:
+            return json.load(f)
+    except IOError:
+        return None
+
+
+def check_sweeps(Pout, use):
+    """Raise ValueError if Pout is a LazyArray of block averages; use says what needs the sweeps."""
+    info = Pout.averaging if isinstance(Pout, LazyArray) else None
+    if info:
+        raise ValueError('%s: the rows are averages of %i sweeps each, %s needs individual sweeps%s'
+                         % (Pout.path, info['sweeps_per_block'], use,
+                            ' (see %s)' % info['raw_file'] if info.get('raw_file') else ''))
+
+
+class LazyArray(object):
+    """Read only, memory-mapped view of a (sweeps, bins) .npy, opened on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self._header = None  # (dtype, sweeps, bins), read when first needed
+        self._mmap = None
+        self.bytes_read = 0  # bytes of this view handed out so far
+
+    def _bounds(self):
+        """dtype and (start, stop) sweeps and bins of this view, from the .npy header on first use."""
+        if self._header is None:
+            file_shape, dtype, fortran_order, offset = npy_header(self.path)
+            if len(file_shape) != 2 or fortran_order:
+                raise ValueError('%s is not a C ordered sweeps x bins array' % self.path)
+            self._header = (dtype, (0, file_shape[0]), (0, file_shape[1]))
+        return self._header
+
+    @property
+    def dtype(self):
+        return self._bounds()[0]
+
+    @property
+    def shape(self):
+        dtype, rows, columns = self._bounds()
+        return (rows[1] - rows[0], columns[1] - columns[0])
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def averaging(self):
+        """The averaging sidecar of the file (see averaging()), None for individual sweeps."""
+        return averaging(self.path)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        if self._header is None:
+            return 'LazyArray(%r)' % self.path
+        dtype, rows, columns = self._header
+        return 'LazyArray(%r, sweeps %i:%i, bins %i:%i%s)' % (self.path, rows[0], rows[1], columns[0], columns[1],
+                                                                '' if self._mmap is None else ', mapped')
+
+    def _narrow(self, start, stop, axis):
+        header = list(self._bounds())
+        first, last = header[axis]
+        start, stop, step = slice(start, stop).indices(last - first)
+        header[axis] = (first + start, first + max(stop, start))
+        view = copy.copy(self)  # shares the memory map once it is open
+        view._header = tuple(header)
+        view.bytes_read = 0
+        return view
+
+    def window(self, data_s, data_f):
+        """View of bin columns data_s:data_f."""
+        return self._narrow(data_s, data_f, 2)
+
+    def sweeps(self, start=None, stop=None):
+        """View of sweeps start:stop."""
+        return self._narrow(start, stop, 1)
+
+    def _view(self):
+        dtype, rows, columns = self._bounds()
+        if self._mmap is None:
+            self._mmap = np.load(self.path, mmap_mode='r')
+        return self._mmap[rows[0]:rows[1], columns[0]:columns[1]]
+
+    def _read(self, key=Ellipsis, dtype=None):
+        data = np.array(self._view()[key], dtype=dtype)
+        self.bytes_read += data.size*self.dtype.itemsize
+        return data
+
+    def __getitem__(self, key):
+        return self._read(key)
+
+    def __array__(self, dtype=None, copy=None):
+        return self._read(dtype=dtype)
+
+    def _blocks(self):
+        """Consecutive (sweeps, bins) blocks of at most BLOCK_BYTES, in float64."""
+        step = max(BLOCK_BYTES//max(self.shape[1]*self.dtype.itemsize, 1), 1)
+        for start in range(0, self.shape[0], step):
+            yield self._read(slice(start, start + step), dtype=float)
+
+    def _moments(self):
+        """Per bin count, mean and sum of squared deviations, merged block by block (Chan et al.)."""
+        n, mean, m2 = 0, np.zeros(self.shape[1]), np.zeros(self.shape[1])
+        for block in self._blocks():
+            nb = block.shape[0]
+            block_mean = np.mean(block, axis=0)
+            delta = block_mean - mean
+            m2 += np.sum((block - block_mean)**2, axis=0) + delta**2*n*nb/(n + nb)
+            mean += delta*nb/(n + nb)
+            n += nb
+        return n, mean, m2
+
+    def _reduce(self, axis, dtype, out, keepdims, result):
+        if dtype is not None:
+            result = result.astype(dtype, copy=False)
+        if keepdims:
+            result = result[np.newaxis, :]
+        if out is not None:
+            out[...] = result
+            return out
+        return result
+
+    def mean(self, axis=None, dtype=None, out=None, keepdims=False, **kwargs):
+        """Mean over the sweeps (axis 0 or -2), streamed block by block and accumulated in float64.
+        Other axes read the selection into memory."""
+        if axis not in (0, -2):
+            return np.mean(self._read(), axis=axis, dtype=dtype, out=out, keepdims=keepdims, **kwargs)
+        blocks = self._blocks()
+        first = next(blocks, None)
+        if first is None:
+            return np.mean(np.zeros((0, self.shape[1])), axis=0)
+        total = np.sum(first, axis=0)
+        for block in blocks:
+            total += np.sum(block, axis=0)
+        return self._reduce(axis, dtype, out, keepdims, total/self.shape[0])
+
+    def var(self, axis=None, dtype=None, out=None, ddof=0, keepdims=False, **kwargs):
+        """Variance over the sweeps (axis 0 or -2), streamed as mean()."""
+        if axis not in (0, -2):
+            return np.var(self._read(), axis=axis, dtype=dtype, out=out, ddof=ddof, keepdims=keepdims, **kwargs)
+        n, mean, m2 = self._moments()
+        return self._reduce(axis, dtype, out, keepdims, m2/max(n - ddof, 0))
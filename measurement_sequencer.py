@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Unattended hot/cold/noise diode measurement sequencer for the SignalShark capture scripts.
+A sequence is a list of (load, noise diode temperature in K) states that are captured
+back-to-back in one session. Each state is written with the naming convention the analysis
+and ND_analysis scripts expect:
+    band+'/'+band+'_'+meas+'_hot.npy'          (noise diode off)
+    band+'/'+band+'_'+meas+'_5k_nd_cold.npy'   (5 K noise diode on)
+
+The load and noise diode are switched through a driver with set_load(load) and
+set_noise_diode(temperature) methods, so site hardware can be plugged in without touching
+the sequencer. ManualSwitch keeps the operator prompts, NullSwitch does nothing (testing) and
+SimulatorSwitch drives signal_shark_simulator.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import time
+
+import sweep_acquisition as acq
+import sweep_statistics as st
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+# Noise diode states are grouped per load so the (slow) load is only switched once
+FULL_SEQUENCE = [('hot', 0), ('hot', 5), ('hot', 20), ('cold', 0), ('cold', 5), ('cold', 20)]
+YFACTOR_SEQUENCE = [('hot', 0), ('cold', 0)]
+
+
+#%%
+def state_name(band, meas, load, nd, directory=None):
+    """File name (without .npy) for one state, e.g. 'B1LCP/B1LCP_nom_gain_5k_nd_cold'.
+    The directory defaults to the band name."""
+    suffix = '_%ik_nd' % nd if nd else ''
+    return (directory or band)+'/'+band+'_'+meas+suffix+'_'+load
+
+
+class NullSwitch(object):
+    """No-op load/noise diode driver for testing. Remembers the requested state."""
+
+    def __init__(self):
+        self.load = None
+        self.nd = 0
+
+    def set_load(self, load):
+        self.load = load
+
+    def set_noise_diode(self, temperature):
+        self.nd = temperature
+
+
+class ManualSwitch(NullSwitch):
+    """Ask the operator to switch, as the capture scripts did with input()."""
+
+    def set_load(self, load):
+        if load != self.load:
+            input('Connect %s load. Press enter when ready:' % load)
+        self.load = load
+
+    def set_noise_diode(self, temperature):
+        if temperature != self.nd:
+            input('Set noise diode to %s. Press enter when ready:' % ('%i K' % temperature if temperature else 'off'))
+        self.nd = temperature
+
+
+class SimulatorSwitch(NullSwitch):
+    """Switch the load and noise diode of a signal_shark_simulator instance over SCPI."""
+
+    def __init__(self, signal_shark):
+        NullSwitch.__init__(self)
+        self.signal_shark = signal_shark
+
+    def set_load(self, load):
+        self.signal_shark.write('SIMulate:LOAD %s' % load.upper())
+        self.load = load
+
+    def set_noise_diode(self, temperature):
+        self.signal_shark.write('SIMulate:NDIode %g' % temperature)
+        self.nd = temperature
+
+
+class SwitchGroup(object):
+    """Forward load and noise diode changes to several drivers, e.g. one SimulatorSwitch per chain."""
+
+    def __init__(self, *switches):
+        self.switches = switches
+
+    def set_load(self, load):
+        for switch in self.switches:
+            switch.set_load(load)
+
+    def set_noise_diode(self, temperature):
+        for switch in self.switches:
+            switch.set_noise_diode(temperature)
+
+
+def run_sequence(signal_shark, band, meas, sequence, switch, dataTrace, transfer='ascii',
+                 pipelined=True, resume=False, teff_target=None, minSweeps=5,
+                 Tref_hot=273.15+31.5, Tref_cold=10.7):
+    """Capture every (load, nd) state in sequence back-to-back into dataTrace and save each as
+    linear power. With teff_target (K) set, each state stops adaptively (see sweep_statistics)
+    and dataTrace is sized for the maximum number of sweeps. The idle time between the last sweep
+    of one state and the first sweep of the next is printed and written to
+    band+'/'+band+'_'+meas+'_sequence.txt'. Returns a list of (file name, sweeps/s, idle time in s)."""
+    numSweeps, numPoints = dataTrace.shape
+    window = st.analysis_window(band, numPoints)
+    captured = {}  # (load, nd) -> power array, the reference for the other load in adaptive mode
+    results = []
+    t_last = None
+    with open(band+'/'+band+'_'+meas+'_sequence.txt', 'a') as log:
+        log.write('# %s sequence %s\n' % (time.strftime('%Y-%m-%d %H:%M:%S'), sequence))
+        for load, nd in sequence:
+            name = state_name(band, meas, load, nd)
+            switch.set_load(load)
+            switch.set_noise_diode(nd)
+            idle = 0.0 if t_last is None else time.perf_counter() - t_last
+            t0 = time.perf_counter()
+            if teff_target:
+                reference = captured.get(('cold' if load == 'hot' else 'hot', nd))
+                Pout = st.adaptive_capture(signal_shark, name, dataTrace, load, window, Tref_hot,
+                                           Tref_cold, teff_target, minSweeps, reference, transfer,
+                                           pipelined, resume, verbose=False)
+            else:
+                store = acq.SweepStore(name, numSweeps, numPoints, resume, dataTrace.dtype)
+                acq.acquire_sweeps(signal_shark, dataTrace, transfer, pipelined, label=name,
+                                   verbose=False, start=store.completed, on_sweep=store.append,
+                                   telemetry=store.telemetry)
+                Pout = store.finalise()
+            t_last = time.perf_counter()
+            rate = Pout.shape[0]/(t_last - t0)
+            captured[(load, nd)] = Pout
+            print('%s: %i sweeps at %.2f sweeps/s, idle before state %.2f s' % (name, Pout.shape[0], rate, idle))
+            log.write('%s %i sweeps %.3f sweeps/s idle %.3f s\n' % (name, Pout.shape[0], rate, idle))
+            results.append((name, rate, idle))
+        total_idle = sum(r[2] for r in results)
+        print('Sequence complete: %i states, total idle time between states %.2f s' % (len(results), total_idle))
+        log.write('# total idle %.3f s\n' % total_idle)
+    return results
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Concurrent capture of several receiver chains (B1LCP, B1RCP, B2LCP, B2RCP) in one hot/cold cycle.
+Every chain has its own analyser connection (a separate SignalShark, or a separate socket task),
+band name and output directory. The chains are configured and captured in parallel from a
+thread pool; the load and noise diode are switched once for all chains between states.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import measurement_sequencer as sq
+import spectrum_analyser as sa
+import sweep_acquisition as acq
+
+
+#%%
+class Chain(object):
+    """One receiver chain: analyser connection, band name and output directory. address is the
+    VISA resource of the chain's analyser and must be set, there is no default."""
+
+    def __init__(self, band, address, directory=None):
+        self.band = band
+        self.address = address
+        self.directory = directory or band
+        self.signal_shark = None
+        self.freq = None
+        self.stats = []  # (file name, sweeps, seconds) per captured state
+
+    def open(self, backend='', transfer='ascii', **settings):
+        """Connect, configure the analyser and save DUTfreq.npy in the output directory.
+        settings are passed on to spectrum_analyser.setup (f_start, f_stop, Rbw, meas_time, Atten)."""
+        if not self.address:
+            raise ValueError('%s: no analyser address set' % self.band)
+        os.makedirs(self.directory, exist_ok=True)
+        self.signal_shark = sa.connect(self.address, backend=backend)
+        sa.setup(self.signal_shark, **settings)
+        acq.trigger_sweep(self.signal_shark)  # the point count is valid after the first sweep
+        self.freq = sa.frequency_axis(self.signal_shark)
+        np.save(self.directory+'/DUTfreq', self.freq)
+        sa.set_trace_format(self.signal_shark, transfer)
+        return self
+
+    def capture(self, meas, load, nd, numSweeps, transfer='ascii', pipelined=True, resume=False,
+                verbose=True, dtype=float):
+        """Capture one state into <directory>/<band>_<meas>[_<nd>k_nd]_<load>.npy, stored in dtype.
+        Returns (file name, sweeps taken, seconds)."""
+        name = sq.state_name(self.band, meas, load, nd, self.directory)
+        dataTrace = np.zeros((numSweeps, len(self.freq)), dtype=dtype)
+        store = acq.SweepStore(name, numSweeps, len(self.freq), resume, dtype)
+        start = store.completed
+        t0 = time.perf_counter()
+        acq.acquire_sweeps(self.signal_shark, dataTrace, transfer, pipelined, label=self.band,
+                           verbose=verbose, start=start, on_sweep=store.append,
+                           telemetry=store.telemetry)
+        store.finalise()
+        result = (name, numSweeps - start, time.perf_counter() - t0)
+        self.stats.append(result)
+        return result
+
+
+def open_chains(chains, backend='', transfer='ascii', **settings):
+    """Open and configure every chain in parallel. chains is a list of Chain. Raises ValueError
+    before connecting to anything if a chain has no analyser address."""
+    missing = [chain.band for chain in chains if not chain.address]
+    if missing:
+        raise ValueError('No analyser address set for %s' % ', '.join(missing))
+    with ThreadPoolExecutor(max_workers=len(chains)) as pool:
+        return list(pool.map(lambda chain: chain.open(backend, transfer, **settings), chains))
+
+
+def capture_chains(chains, meas, sequence, switch, numSweeps=20, transfer='ascii', pipelined=True,
+                   resume=False, verbose=True, dtype=float):
+    """Capture every (load, nd) state of sequence on all chains concurrently, switching the load
+    once per state for all of them. Prints a per-chain throughput summary and returns
+    {band: [(file name, sweeps, seconds), ...]}. dtype is the stored precision (float or np.float32)."""
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(chains)) as pool:
+        for load, nd in sequence:
+            switch.set_load(load)
+            switch.set_noise_diode(nd)
+            t0 = time.perf_counter()
+            results = list(pool.map(lambda chain: chain.capture(meas, load, nd, numSweeps, transfer,
+                                                                pipelined, resume, verbose, dtype), chains))
+            print('%s%s load: %i chains in %.2f s'
+                  % (load, ' + %i K ND' % nd if nd else '', len(results), time.perf_counter() - t0))
+    total = time.perf_counter() - t_start
+    print('%-8s %8s %10s %10s' % ('chain', 'sweeps', 'time (s)', 'sweeps/s'))
+    for chain in chains:
+        sweeps = sum(r[1] for r in chain.stats)
+        seconds = sum(r[2] for r in chain.stats)
+        print('%-8s %8i %10.2f %10.2f' % (chain.band, sweeps, seconds, sweeps/seconds if seconds else 0))
+    print('All chains captured in %.2f s' % total)
+    return {chain.band: chain.stats for chain in chains}
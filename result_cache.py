@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Persistent cache of Y-factor results, so re-running an analysis script to change a plot does not
+recompute Teff, gain, NF and powers.
+
+An entry is keyed on the content of the hot and cold stacks and every parameter of the
+calculation: Tref_hot (from temp_hot_load_degrees_C), Tref_cold, atten, Rbw, T0, the analysis
+window, the precision and the sweep average estimator and its settings. The key is a BLAKE2 hash of these, so
+editing, replacing or re-capturing a stack gives a new key. A lazy_loader.LazyArray is hashed from
+its file and its window is taken from the view bounds. The digest of each file is remembered
+against its size and modification time, so an unchanged file is hashed once. Any other array is
+hashed in memory.
+
+Entries are .npz files of the y_factor result dict in CACHE_DIR (a None rejection mask is left
+out and restored on a hit). A hit touches its entry. After a
+store, the least recently used entries are deleted until the cache is below MAX_BYTES. Every
+lookup prints hit or miss; report() gives the totals for the session.
+
+Bootstrap intervals are cached the same way, keyed also on the window, n_boot, confidence and
+seed, so a re-run reads neither the stacks nor redraws the replicates:
+
+    result = rc.y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw)  # as yf.y_factor
+    ci = rc.bootstrap_y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw, window=(data_s, data_f),
+                               result=result)  # as bs.bootstrap_y_factor
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+
+import bootstrap as bs
+import lazy_loader as ll
+import robust_average as ra
+import y_factor as yf
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.result_cache')
+MAX_BYTES = 2**28  # cache size before least recently used entries are evicted (256 MB)
+DIGEST_FILE = 'digests.json'  # file digests by path, size and modification time
+HASH_BLOCK = 2**24  # bytes read at a time when hashing a file
+VERSION = 3  # part of every key, increase when y_factor results change
+
+
+#%%
+def _digest_bytes(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class ResultCache(object):
+    """Size bounded, least recently used cache of y_factor results and bootstrap intervals in directory."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, verbose=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        self._digests = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def file_digest(self, path):
+        """Content digest of a file, rehashed only if its size or modification time changed."""
+        if self._digests is None:
+            try:
+                with open(self._path(DIGEST_FILE)) as f:
+                    self._digests = json.load(f)
+            except (IOError, ValueError):
+                self._digests = {}
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self._digests.get(path)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b''):
+                h.update(block)
+        self._digests[path] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(DIGEST_FILE), 'w') as f:
+            json.dump(self._digests, f)
+        return h.hexdigest()
+
+    def _describe(self, Pout):
+        """Key entry of one power stack: file digest and view bounds, or in-memory content."""
+        if isinstance(Pout, ll.LazyArray):
+            dtype, rows, columns = Pout._bounds()
+            return ['file', self.file_digest(Pout.path), list(rows), list(columns)]
+        Pout = np.ascontiguousarray(Pout)
+        return ['array', Pout.dtype.str, list(Pout.shape), _digest_bytes(Pout.data)]
+
+    def key(self, Pout_hot, Pout_cold, **parameters):
+        """Hash of both stacks and the parameters (numbers, strings, or arrays of them)."""
+        parameters = dict((name, np.asarray(value).tolist()) for name, value in parameters.items())
+        description = [VERSION, self._describe(Pout_hot), self._describe(Pout_cold), sorted(parameters.items())]
+        return _digest_bytes(json.dumps(description).encode())
+
+    def get(self, key):
+        """Cached result dict, or None."""
+        path = self._path(key + '.npz')
+        try:
+            with np.load(path) as entry:
+                result = dict((name, entry[name]) for name in entry.files)
+        except (IOError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+        os.utime(path)  # most recently used
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        os.makedirs(self.directory, exist_ok=True)
+        partial = self._path(key + '.partial.npz')
+        np.savez(partial, **dict((name, value) for name, value in result.items() if value is not None))
+        os.replace(partial, self._path(key + '.npz'))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache is below max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz') and not name.endswith('.partial.npz'):
+                stat = os.stat(self._path(name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(self._path(name))
+            total -= size
+
+    def y_factor(self, Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, dtype=None, check=True,
+                 estimator=None):
+        """y_factor.y_factor, from the cache when the stacks and parameters are unchanged."""
+        dtype = np.dtype(dtype or np.result_type(Pout_hot.dtype, Pout_cold.dtype))
+        estimator = estimator or ra.ESTIMATOR
+        key = self.key(Pout_hot, Pout_cold, Tref_hot=Tref_hot, Tref_cold=Tref_cold, atten=atten, Rbw=Rbw,
+                       T0=yf.T0, dtype=dtype.str, check=check, estimator=estimator, clip=ra.CLIP, trim=ra.TRIM,
+                       screen=ra.SCREEN)
+        result = self.get(key)
+        if self.verbose:
+            print('result cache %s: %s' % ('hit' if result is not None else 'miss', key[:12]))
+        if result is None:
+            result = yf.y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw, dtype, check, estimator)
+            self.put(key, result)
+        result.setdefault('rejected_hot', None)  # stored only when samples were rejected
+        result.setdefault('rejected_cold', None)
+        return result
+
+    def bootstrap_y_factor(self, Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, window=None,
+                           n_boot=bs.N_BOOT, confidence=bs.CONFIDENCE, seed=bs.SEED, estimator=None, result=None,
+                           workers=1):
+        """bootstrap.bootstrap_y_factor, from the cache when the stacks and parameters are unchanged.
+        result (the y_factor result of the same stacks) is only used on a miss."""
+        estimator = estimator or ra.ESTIMATOR
+        key = self.key(Pout_hot, Pout_cold, product='bootstrap', Tref_hot=Tref_hot, Tref_cold=Tref_cold,
+                       atten=atten, Rbw=Rbw, T0=yf.T0, window=window or [], n_boot=n_boot, confidence=confidence,
+                       seed=seed, estimator=estimator, clip=ra.CLIP, trim=ra.TRIM,
+                       screen=ra.SCREEN)
+        entry = self.get(key)
+        if self.verbose:
+            print('result cache %s: %s (bootstrap)' % ('hit' if entry is not None else 'miss', key[:12]))
+        if entry is not None:
+            intervals = dict((name, value) for name, value in entry.items() if not name.startswith('band_'))
+            intervals['n_boot'] = int(entry['n_boot'])
+            intervals['confidence'] = float(entry['confidence'])
+            if window is not None:
+                intervals['band'] = dict((name[len('band_'):], tuple(float(v) for v in value))
+                                         for name, value in entry.items() if name.startswith('band_'))
+            return intervals
+        intervals = bs.bootstrap_y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw, window, n_boot,
+                                          confidence, seed, workers=workers, estimator=estimator, result=result)
+        entry = dict((name, value) for name, value in intervals.items() if name != 'band')
+        entry.update(('band_' + name, np.array(value)) for name, value in intervals.get('band', {}).items())
+        self.put(key, entry)
+        return intervals
+
+    def report(self):
+        lookups = self.hits + self.misses
+        return 'result cache: %i hits, %i misses (%.0f%% hit rate)' % (self.hits, self.misses,
+                                                                       100.0*self.hits/lookups if lookups else 0.0)
+
+
+_default = ResultCache()
+
+
+def y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, dtype=None, check=True, estimator=None):
+    """y_factor.y_factor through the default cache in CACHE_DIR."""
+    return _default.y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw, dtype, check, estimator)
+
+
+def bootstrap_y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, window=None, n_boot=bs.N_BOOT,
+                       confidence=bs.CONFIDENCE, seed=bs.SEED, estimator=None, result=None, workers=1):
+    """bootstrap.bootstrap_y_factor through the default cache in CACHE_DIR."""
+    return _default.bootstrap_y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten, Rbw, window, n_boot,
+                                       confidence, seed, estimator, result, workers)
+
+
+def report():
+    return _default.report()
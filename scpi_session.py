@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Record a SignalShark SCPI session and replay it without an instrument.
+
+RecordingSession wraps an open pyvisa resource and logs every command with the raw bytes the
+analyser sent back and the latency from the command to the last byte of its response. The
+transcript is saved as gzip compressed JSON lines (ASCII responses as text, binary blocks base64).
+
+ReplaySession stands in for the resource: each command is matched to the next recorded one and
+its recorded response is served to read()/read_bytes() in whatever sized pieces the code asks
+for, so parsing, buffering and persistence changes can be benchmarked against real site traffic.
+speed=1 waits out the recorded latencies (original timing and jitter), speed=0 replays as fast
+as possible.
+
+    signal_shark = scpi.RecordingSession(signal_shark, 'B1LCP/B1LCP_nom_gain_session.jsonl.gz')
+    signal_shark = scpi.ReplaySession('B1LCP/B1LCP_nom_gain_session.jsonl.gz', speed=0)
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import atexit
+import base64
+import gzip
+import json
+import time
+
+import numpy as np
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+TRANSCRIPT_VERSION = 1
+
+
+#%%
+def save_transcript(path, header, exchanges):
+    """Write header and exchanges [(t, command, response bytes, latency), ...] to path."""
+    with gzip.open(path, 'wt') as f:
+        f.write(json.dumps(dict(header, version=TRANSCRIPT_VERSION)) + '\n')
+        for t, command, response, latency in exchanges:
+            record = {'t': round(t, 6), 'cmd': command, 'lat': round(latency, 6)}
+            try:
+                record['r'] = response.decode('ascii')
+            except UnicodeDecodeError:
+                record['b'] = base64.b64encode(response).decode('ascii')
+            f.write(json.dumps(record) + '\n')
+
+
+def load_transcript(path):
+    """Read a transcript. Returns (header, [(t, command, response bytes, latency), ...])."""
+    exchanges = []
+    with gzip.open(path, 'rt') as f:
+        header = json.loads(f.readline())
+        for line in f:
+            record = json.loads(line)
+            response = record['r'].encode('ascii') if 'r' in record else base64.b64decode(record['b'])
+            exchanges.append((record['t'], record['cmd'], response, record['lat']))
+    return header, exchanges
+
+
+class RecordingSession(object):
+    """Pass-through wrapper around a pyvisa resource that records the session to path.
+    The transcript is written by save() or close() and when the interpreter exits."""
+
+    def __init__(self, resource, path):
+        self.resource = resource
+        self.path = path
+        self.exchanges = []
+        self.t0 = time.perf_counter()
+        self._current = None  # [t, command, response, t_start, t_end] of the exchange in progress
+        atexit.register(self.save)
+
+    # Settings the capture code reads and changes are kept on the real resource
+    timeout = property(lambda self: self.resource.timeout,
+                       lambda self, value: setattr(self.resource, 'timeout', value))
+    read_termination = property(lambda self: self.resource.read_termination,
+                                lambda self, value: setattr(self.resource, 'read_termination', value))
+    write_termination = property(lambda self: self.resource.write_termination,
+                                 lambda self, value: setattr(self.resource, 'write_termination', value))
+
+    def _finish(self):
+        if self._current is not None:
+            t, command, response, t_start, t_end = self._current
+            self.exchanges.append((t, command, bytes(response), t_end - t_start))
+            self._current = None
+
+    def _received(self, data):
+        self._current[2] += data
+        self._current[4] = time.perf_counter()
+
+    def write(self, command):
+        self._finish()
+        t_start = time.perf_counter()
+        result = self.resource.write(command)
+        self._current = [t_start - self.t0, command, bytearray(), t_start, time.perf_counter()]
+        return result
+
+    def read(self):
+        data = self.resource.read()
+        self._received((data + self.resource.read_termination).encode(getattr(self.resource, 'encoding', 'ascii')))
+        return data
+
+    def read_bytes(self, count, **kwargs):
+        data = self.resource.read_bytes(count, **kwargs)
+        self._received(data)
+        return data
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def save(self):
+        self._finish()
+        header = {'read_termination': self.resource.read_termination,
+                  'write_termination': self.resource.write_termination,
+                  'timeout': self.resource.timeout,
+                  'recorded': time.strftime('%Y-%m-%d %H:%M:%S')}
+        save_transcript(self.path, header, self.exchanges)
+
+    def close(self):
+        self.save()
+        atexit.unregister(self.save)
+        self.resource.close()
+
+
+class ReplaySession(object):
+    """Replays a transcript in place of the analyser connection. speed scales the recorded
+    latencies (1 = original timing, 0 = no waiting). With strict=False commands the code no longer
+    sends are skipped; a command that is not found further on in the transcript raises IOError."""
+
+    def __init__(self, path, speed=1.0, strict=False):
+        header, self.exchanges = load_transcript(path)
+        self.read_termination = header['read_termination']
+        self.write_termination = header['write_termination']
+        self.timeout = header['timeout']
+        self.encoding = 'ascii'
+        self.speed = speed
+        self.strict = strict
+        self.index = 0  # next exchange
+        self.skipped = 0
+        self.response = b''
+        self.pos = 0
+        self.t_ready = 0.0
+
+    def write(self, command):
+        i = self.index
+        while i < len(self.exchanges) and self.exchanges[i][1] != command:
+            if self.strict:
+                raise IOError('Replay expected %r, got %r' % (self.exchanges[i][1], command))
+            i += 1
+        if i == len(self.exchanges):
+            raise IOError('%r is not in the transcript after exchange %i' % (command, self.index))
+        self.skipped += i - self.index
+        t, command, self.response, latency = self.exchanges[i]
+        self.index = i + 1
+        self.pos = 0
+        self.t_ready = time.perf_counter() + latency*self.speed
+        if not self.response:
+            self._wait()
+        return len(command) + len(self.write_termination)
+
+    def _wait(self):
+        delay = self.t_ready - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def read_bytes(self, count, **kwargs):
+        self._wait()
+        if self.pos + count > len(self.response):
+            raise IOError('Read of %i bytes past the recorded response to %r'
+                          % (count, self.exchanges[self.index-1][1]))
+        data = self.response[self.pos:self.pos+count]
+        self.pos += count
+        return data
+
+    def read(self):
+        self._wait()
+        end = self.response.find(self.read_termination.encode('ascii'), self.pos)
+        if end < 0:
+            raise IOError('No recorded response left for %r' % self.exchanges[self.index-1][1])
+        data = self.response[self.pos:end].decode(self.encoding)
+        self.pos = end + len(self.read_termination)
+        return data
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def close(self):
+        pass
+
+    def report(self):
+        """Print the size and recorded latencies of the transcript."""
+        latency = np.array([e[3] for e in self.exchanges])
+        nbytes = sum(len(e[2]) for e in self.exchanges)
+        print('%i exchanges, %i response bytes, latency mean %.2f ms, max %.2f ms, %i skipped so far'
+              % (len(self.exchanges), nbytes, np.mean(latency)*1e3, np.max(latency)*1e3, self.skipped))
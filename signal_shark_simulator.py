@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Local stand-in for the Narda SignalShark so the capture scripts can be run, profiled and
+regression tested away from the Kutunse site.
+
+The simulator listens on a TCP socket and speaks the SCPI subset used by the capture scripts
+(*IDN?, *RST, *CLS, TASK:NEW?, SPEC:FREQ:*, SPECTRUM:RBW, SPECTRUM:MEAS:TIME, RUN:SINGLE?,
+SPECTRUM:DATA:UPDATE?, SPEC:DATA:LEVel? RMS, SPECTRUM:DATA:COUNT?, SYSTEM:ERROR:ALL?, FORMAT:*).
+Any other setting is stored and can be queried back. Commands may be chained with ';'.
+
+Traces are synthesised radiometer noise for the selected load:
+    P = k*(T_load + T_nd + Teff)*G*Rbw*(1 + n/sqrt(Rbw*meas_time)),  n ~ N(0,1) per bin
+with a sinusoidal gain ripple on top of the nominal gain. The load is switched with
+SIMulate:LOAD HOT|COLD and the noise diode with SIMulate:NDIode <K> (or the attributes).
+latency is charged for every command, turnaround once per program message (the network and
+parser round trip that chaining commands with ';' saves).
+
+Usage:
+    python signal_shark_simulator.py --port 5300 --latency 0.002 --turnaround 0.001
+and connect to TCPIP0::127.0.0.1::5300::SOCKET with the pyvisa-py backend ('@py').
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import re
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+k = 1.38e-23  # Boltzman's constand
+IDN = 'Narda,SignalShark (simulated),000000,0.0'
+VOWELS = 'AEIOU'
+
+
+#%%
+def short_form(header):
+    """Reduce an SCPI header to its short form, e.g. 'SPECTRUM:FREQUENCY:START?' -> 'SPEC:FREQ:STAR?'.
+    Nodes longer than four characters keep four characters, or three if the fourth is a vowel."""
+    query = header.endswith('?')
+    nodes = []
+    for node in header.rstrip('?').rstrip(':').upper().split(':'):  # the scripts send 'SENSE:ATTENUATOR: 10dB'
+        if len(node) > 4:
+            node = node[:3] if node[3] in VOWELS else node[:4]
+        nodes.append(node)
+    return ':'.join(nodes) + ('?' if query else '')
+
+
+def parse_frequency(arg):
+    """Convert '368 MHZ' or '368000000' to Hz."""
+    value, unit = re.match(r'\s*([-+0-9.eE]+)\s*([KMG]?HZ)?', arg.upper()).groups()
+    return float(value)*{None: 1.0, 'HZ': 1.0, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}[unit]
+
+
+def parse_time(arg):
+    """Convert '100ms' or '0.1' to s."""
+    arg = arg.strip().lower()
+    for unit, scale in (('ms', 1e-3), ('us', 1e-6), ('s', 1.0)):
+        if arg.endswith(unit):
+            return float(arg[:-len(unit)])*scale
+    return float(arg)
+
+
+class SignalSharkSimulator(object):
+    """Simulated SignalShark with configurable gain, Teff, ripple and per-command latency."""
+
+    def __init__(self, host='127.0.0.1', port=5300, gain_dB=65.0, teff=80.0, ripple_dB=0.5,
+                 ripple_period_MHz=40.0, latency=0.0, sweep_time=0.1, numPoints=801,
+                 Tref_hot=273.15+31.5, Tref_cold=10.7, seed=None, turnaround=0.0):
+        self.host = host
+        self.port = port
+        self.gain_dB = gain_dB  # nominal receiver gain (dB)
+        self.teff = teff  # receiver effective noise temperature (K)
+        self.ripple_dB = ripple_dB  # peak gain ripple (dB)
+        self.ripple_period_MHz = ripple_period_MHz
+        self.latency = latency  # added to every command (s)
+        self.turnaround = turnaround  # added once per program message (s)
+        self.sweep_time = sweep_time  # time RUN:SINGLE? takes to complete (s)
+        self.numPoints = numPoints
+        self.Tref_hot = Tref_hot
+        self.Tref_cold = Tref_cold
+        self.load = 'cold'
+        self.nd_temperature = 0.0  # injected noise diode temperature (K)
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.server = None
+        self.errors = []  # SCPI error queue, kept by *RST and emptied by *CLS or SYSTEM:ERROR:ALL?
+        self.reset()
+
+    #%% Instrument state
+    def reset(self):
+        self.settings = {}
+        self.f_start = 368e6
+        self.f_stop = 1168e6
+        self.rbw = 2e6
+        self.meas_time = 0.1
+        self.data_format = 'ASCII'
+        self.byte_order = 'NORMAL'
+        self.traces = {'RMS': True, 'PPK': True}  # enabled detector traces
+        self.trace = np.zeros(self.numPoints)
+        self.sweeps = 0
+
+    @property
+    def address(self):
+        return 'TCPIP0::%s::%i::SOCKET' % (self.host, self.port)
+
+    def frequencies(self):
+        return np.linspace(self.f_start, self.f_stop, self.numPoints)
+
+    def model_power(self):
+        """Expected power per bin (W) for the current load and noise diode state."""
+        f = self.frequencies()
+        gain_dB = self.gain_dB + self.ripple_dB*np.sin(2*np.pi*f/(self.ripple_period_MHz*1e6))
+        T_load = self.Tref_hot if self.load == 'hot' else self.Tref_cold
+        return k*(T_load + self.nd_temperature + self.teff)*10**(gain_dB/10)*self.rbw
+
+    def scan_count(self):
+        return max(int(float(self.settings.get('SPEC:SCAN:COUN', '1'))), 1)
+
+    def sweep(self):
+        """Synthesise one RMS trace (dBm) with radiometer noise. With SPECTRUM:SCAN:COUNT n the
+        trace is the RMS (linear power) average of n scans."""
+        power = self.model_power()
+        sigma = 1/np.sqrt(self.rbw*self.meas_time*self.scan_count())
+        power = power*(1 + sigma*self.rng.standard_normal(self.numPoints))
+        self.trace = 10*np.log10(power/1e-3)
+        self.sweeps += 1
+
+    def format_trace(self):
+        if self.data_format.startswith('REAL'):
+            dtype = '<f4' if self.byte_order.startswith('SWAP') else '>f4'
+            payload = self.trace.astype(dtype).tobytes()
+            length = str(len(payload)).encode()
+            return b'#' + str(len(length)).encode() + length + payload
+        return ','.join('%.2f' % x for x in self.trace).encode()
+
+    #%% Command handling
+    def execute(self, command):
+        """Execute one SCPI command. Returns the response (bytes) for queries, else None."""
+        header, _, arg = command.strip().partition(' ')
+        arg = arg.strip()
+        key = short_form(header)
+        if key == '*IDN?':
+            return IDN.encode()
+        if key == '*RST':
+            self.reset()
+            return None
+        if key == '*CLS':
+            self.errors = []
+            return None
+        if key == 'TASK:NEW?':  # sent with write() by the capture scripts, so no response
+            return None
+        if key in ('SYST:ERR:ALL?', 'SYST:ERR?'):
+            errors, self.errors = self.errors, []
+            return (','.join(errors) if errors else '0,"No error"').encode()
+        if key in ('SPEC:FREQ:STAR', 'SPEC:FREQ:STOP'):
+            value = parse_frequency(arg)
+            if key.endswith('STAR'):
+                self.f_start = value
+            else:
+                self.f_stop = value
+            return None
+        if key == 'SPEC:FREQ:STAR?':
+            return ('%.1f' % self.f_start).encode()
+        if key == 'SPEC:FREQ:STOP?':
+            return ('%.1f' % self.f_stop).encode()
+        if key == 'SPEC:RBW':
+            self.rbw = parse_frequency(arg)
+            return None
+        if key == 'SPEC:RBW?':
+            return ('%.1f' % self.rbw).encode()
+        if key == 'SPEC:MEAS:TIME':
+            self.meas_time = parse_time(arg)
+            return None
+        if key == 'SPEC:MEAS:TIME?':
+            return ('%g' % self.meas_time).encode()
+        if key == 'RUN:SING?':
+            time.sleep(self.sweep_time*self.scan_count())
+            self.sweep()
+            return b'0'
+        if key == 'SPEC:DATA:UPD?':
+            return b'0'
+        if key == 'SPEC:DATA:LEV?':
+            return self.format_trace()
+        if key == 'SPEC:DATA:COUN?':
+            return ('%i' % self.numPoints).encode()
+        if key == 'SPEC:TRAC:ENAB':
+            name, _, state = arg.upper().partition(',')
+            self.traces[name.strip()] = state.strip() in ('ON', '1')
+            return None
+        if key == 'SPEC:TRAC:LIST?':
+            return ','.join(name for name, on in self.traces.items() if on).encode()
+        if key == 'FORM:DATA':
+            self.data_format = arg.upper().replace(' ', '')
+            return None
+        if key == 'FORM:BORD':
+            self.byte_order = arg.upper()
+            return None
+        if key == 'SIM:LOAD':
+            self.load = arg.lower()
+            return None
+        if key == 'SIM:NDI':
+            self.nd_temperature = float(arg)
+            return None
+        if key.endswith('?'):
+            if key[:-1] in self.settings:
+                return self.settings[key[:-1]].encode()
+            self.errors.append('-113,"Undefined header;%s"' % header)
+            return None
+        self.settings[key] = arg
+        return None
+
+    def handle_line(self, line):
+        """Execute a ';' separated program message. Returns the joined responses or None."""
+        responses = []
+        with self.lock:
+            if self.turnaround:
+                time.sleep(self.turnaround)
+            for command in line.split(';'):
+                if not command.strip():
+                    continue
+                if self.latency:
+                    time.sleep(self.latency)
+                response = self.execute(command)
+                if response is not None:
+                    responses.append(response)
+        return b';'.join(responses) if responses else None
+
+    #%% TCP server
+    def start(self):
+        """Start serving in a background thread. Returns self so it can be chained."""
+        simulator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    response = simulator.handle_line(line.decode('ascii', 'replace').rstrip('\r\n'))
+                    if response is not None:
+                        self.wfile.write(response + b'\r\n')
+                        self.wfile.flush()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]  # port=0 picks a free port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+#%%
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Simulated SignalShark SCPI server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5300)
+    parser.add_argument('--gain', type=float, default=65.0, help='nominal gain (dB)')
+    parser.add_argument('--teff', type=float, default=80.0, help='effective noise temperature (K)')
+    parser.add_argument('--ripple', type=float, default=0.5, help='peak gain ripple (dB)')
+    parser.add_argument('--latency', type=float, default=0.0, help='per-command latency (s)')
+    parser.add_argument('--turnaround', type=float, default=0.0, help='per-message round trip (s)')
+    parser.add_argument('--sweep-time', type=float, default=0.1, help='time per sweep (s)')
+    parser.add_argument('--points', type=int, default=801)
+    args = parser.parse_args()
+
+    simulator = SignalSharkSimulator(args.host, args.port, args.gain, args.teff, args.ripple,
+                                     latency=args.latency, sweep_time=args.sweep_time,
+                                     numPoints=args.points, turnaround=args.turnaround).start()
+    print('Simulated SignalShark listening on %s' % simulator.address)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
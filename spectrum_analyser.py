@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Shared helpers for talking to the Narda SignalShark spectrum analyser over a SCPI socket.
+The capture scripts in the campaign directories import this module (it lives in the
+repository root, so they add '..' to sys.path first).
+
+Trace data can be fetched in two ways:
+    'ascii'  - SPEC:DATA:LEVel? RMS returns comma separated dBm values (the original method)
+    'binary' - the same query returns an IEEE 488.2 definite length block of float32 values
+               which is decoded straight into the caller's preallocated dataTrace row
+
+A binary block is read with one read_bytes(length) call per trace (the VISA library assembles
+its socket reads into the returned bytes) and np.frombuffer views those bytes, so the cast into
+dataTrace is the only copy after the read. fetch_bulk reads the blocks of a whole batch with one
+read_bytes call and decodes them through a strided view, again with the cast as the only copy.
+
+fetch_bulk/decode_bulk queue several RUN:SINGLE? / SPECTRUM:DATA:UPDATE? / trace queries in one
+';' chained program message and decode the whole (sweeps, points) block in one pass. read_bulk
+reads the response on its own, for callers that send the next message before reading.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import re
+import socket
+import time
+
+import numpy as np
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+TRACE_QUERY = 'SPEC:DATA:LEVel? RMS'  # fetch the RMS trace (dBm)
+TRANSFER_MODES = ('ascii', 'binary')
+
+
+#%%
+def connect(address='TCPIP0::192.168.2.124::5300::SOCKET', timeout=50000, backend=''):
+    """Open a socket connection to the SignalShark with the terminations the scripts use.
+    Pass backend='@py' to use pyvisa-py instead of the installed VISA library."""
+    import pyvisa
+
+    rm = pyvisa.ResourceManager(backend)
+    signal_shark = rm.open_resource(address)
+    signal_shark.read_termination = '\r\n'
+    signal_shark.write_termination = '\r\n'
+    signal_shark.timeout = timeout
+    if address.upper().endswith('::SOCKET'):
+        set_nodelay(signal_shark)
+    return signal_shark
+
+
+def set_nodelay(signal_shark):
+    """Turn off Nagle's algorithm on a socket connection. A long bulk command is written in several
+    chunks and without this each chunk waits for the analyser's delayed ACK (~40 ms).
+    Returns False if neither the VISA library nor the pyvisa-py socket allows it."""
+    import pyvisa
+
+    try:
+        signal_shark.set_visa_attribute(pyvisa.constants.VI_ATTR_TCPIP_NODELAY, True)
+        return True
+    except Exception:  # pyvisa-py does not map the attribute, but exposes its socket
+        pass
+    session = getattr(signal_shark.visalib, 'sessions', {}).get(signal_shark.session)
+    if getattr(session, 'interface', None) is None:
+        return False
+    session.interface.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return True
+
+
+class AnalyserConfig(object):
+    """Desired SignalShark state, held declaratively as (header, expected read back, command).
+    apply() reads the current state back in one ';' chained query and only sends the settings
+    that differ. A full *RST and new spectrum task is done when force_reset is set or the state
+    cannot be read back (e.g. no spectrum task is running yet); the error queue is cleared first, so
+    only errors of the setup itself are reported.
+    f_start, f_stop and Rbw in MHz, meas_time in ms, Atten in dB."""
+
+    def __init__(self, f_start=368, f_stop=1168, Rbw=2, meas_time=100, Atten=10, scan_count=1):
+        self.settings = [
+            ('SYSTem:REMote:TIMeout', 20, 'SYSTem:REMote:TIMeout 20'),  # remote timeout 20 s
+            ('SPECtrum:FREQuency:ENTRy:MODE', 'FSTART_FSTOP', 'SPECtrum:FREQuency:ENTRy:MODE FSTART_FSTOP'),
+            ('SENSE:ATTENUATOR', Atten, 'SENSE:ATTENUATOR: %idB' % Atten),
+            ('SPEC:FREQ:START', f_start*1e6, 'SPEC:FREQ:START %g MHZ' % f_start),
+            ('SPEC:FREQ:STOP', f_stop*1e6, 'SPEC:FREQ:STOP %g MHZ' % f_stop),
+            ('SPECTRUM:RBW', Rbw*1e6, 'SPECTRUM:RBW %g MHz' % Rbw),
+            ('SPECTRUM:MEAS:TIME', meas_time*1e-3, 'SPECTRUM:MEAS:TIME %ims' % meas_time),
+            ('SPECTRUM:TRACE:LIST', 'RMS', 'SPECTRUM:TRACE:ENABLE RMS,ON;SPECTRUM:TRACE:ENABLE PPk,OFF'),
+            ('SPECTRUM:SCAN:COUNT', scan_count, 'SPECTRUM:SCAN:COUNT %i' % scan_count),
+        ]
+
+    def read_back(self, signal_shark):
+        """Query every setting in one batch. Returns the responses, or None if the analyser did
+        not answer all of them."""
+        timeout = signal_shark.timeout
+        signal_shark.timeout = 2000  # a fresh analyser may not answer at all; don't wait 50 s
+        try:
+            response = signal_shark.query(';'.join(header + '?' for header, _, _ in self.settings))
+        except Exception:
+            return None
+        finally:
+            signal_shark.timeout = timeout
+        values = response.split(';')
+        return values if len(values) == len(self.settings) else None
+
+    @staticmethod
+    def matches(expected, value):
+        """Compare a read back value with the expected one, numerically where possible."""
+        if isinstance(expected, str):
+            return value.strip().strip('"').upper() == expected.upper()
+        number = re.match(r'\s*[-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?', value)
+        return number is not None and np.isclose(float(number.group()), expected, rtol=1e-6)
+
+    def differences(self, values):
+        return [command for (_, expected, command), value in zip(self.settings, values)
+                if not self.matches(expected, value)]
+
+    def apply(self, signal_shark, force_reset=False):
+        """Bring the analyser to this state. Returns (commands sent, setup time in s)."""
+        t0 = time.perf_counter()
+        values = None if force_reset else self.read_back(signal_shark)
+        if values is None:
+            signal_shark.write('*CLS')  # a failed read back leaves query errors that *RST does not clear
+            signal_shark.write('SYSTEM:REMOTE:DISPLAY OFF')  # disable GUI for higher performance
+            signal_shark.write('*RST')  # Reset signal shark
+            signal_shark.write("TASK:NEW? 'SPECTRUM'")  # Start new task set instrument to spectrum
+            commands = [command for _, _, command in self.settings]
+        else:
+            commands = self.differences(values)
+        if commands:
+            signal_shark.write('SENSE:STOP')  # Stop the measuring system for configuration
+            for command in commands:
+                signal_shark.write(command)
+        errors = signal_shark.query('SYSTEM:ERROR:ALL?')
+        if not errors.startswith('0'):
+            print('SignalShark setup errors: ' + errors)
+        setup_time = time.perf_counter() - t0
+        print('Setup: %s, %i of %i settings sent in %.3f s'
+              % ('full reset' if values is None else 'cached state', len(commands), len(self.settings), setup_time))
+        return len(commands), setup_time
+
+
+def setup(signal_shark, f_start=368, f_stop=1168, Rbw=2, meas_time=100, Atten=10, force_reset=False):
+    """Configure the spectrum task the way the capture scripts do, sending only what changed.
+    f_start, f_stop and Rbw in MHz, meas_time in ms, Atten in dB. Returns the setup time in s."""
+    return AnalyserConfig(f_start, f_stop, Rbw, meas_time, Atten).apply(signal_shark, force_reset)[1]
+
+
+def frequency_axis(signal_shark):
+    """Frequency of every trace point (Hz) from the analyser's start, stop and point count.
+    A sweep must have been run for SPECTRUM:DATA:COUNT? to be valid."""
+    start_f_set = float(signal_shark.query('SPECTRUM:FREQUENCY:START?'))
+    stop_f_set = float(signal_shark.query('SPECTRUM:FREQUENCY:STOP?'))
+    nr_points_set = int(signal_shark.query('SPECTRUM:DATA:COUNT?'))
+    freq_delta_set = (stop_f_set-start_f_set)/(nr_points_set-1)
+    return np.arange(nr_points_set)*freq_delta_set + start_f_set
+
+
+def set_trace_format(signal_shark, transfer='ascii'):
+    """Select the trace transfer format on the analyser.
+    'binary' selects little endian float32 blocks (FORMAT:DATA REAL,32 with swapped byte order)."""
+    if transfer not in TRANSFER_MODES:
+        raise ValueError("transfer must be one of %s, not %r" % (TRANSFER_MODES, transfer))
+    if transfer == 'binary':
+        signal_shark.write('FORMAT:DATA REAL,32')
+        signal_shark.write('FORMAT:BORDER SWAPPED')
+    else:
+        signal_shark.write('FORMAT:DATA ASCII')
+
+
+def fetch_trace(signal_shark, transfer='ascii', query=TRACE_QUERY):
+    """Query one trace without decoding it.
+    Returns the raw response (str for ASCII, bytes for binary) and the bytes transferred."""
+    if transfer == 'binary':
+        signal_shark.write(query)
+        return read_block(signal_shark)
+    temp = signal_shark.query(query)
+    return temp, len(temp) + len(signal_shark.read_termination)
+
+
+def decode_trace(raw, out, transfer='ascii'):
+    """Decode a raw trace from fetch_trace into out (dBm). Returns the parse time in s.
+    Binary payloads are viewed in place with np.frombuffer, so the only copy is the cast into out."""
+    t0 = time.perf_counter()
+    if transfer == 'binary':
+        np.copyto(out, np.frombuffer(raw, dtype='<f4'))
+    else:
+        temp2 = raw.split(',')
+        out[:] = np.array(temp2, dtype=float)
+    return time.perf_counter() - t0
+
+
+def read_block(signal_shark):
+    """Read the payload of an IEEE 488.2 definite length block (#<n><length><data><term>).
+    Returns the payload and the total number of bytes read. Indefinite length blocks (#0) are
+    refused: over a socket their end is only a terminator, which float32 data can contain."""
+    head = signal_shark.read_bytes(2)
+    if head[:1] != b'#' or not head[1:2].isdigit():
+        raise IOError('Expected a binary block from the analyser, got %r' % head)
+    ndigits = int(head[1:2])
+    if ndigits == 0:
+        raise IOError('The analyser sent an indefinite length block (#0), only definite length '
+                      'blocks are supported')
+    length = int(signal_shark.read_bytes(ndigits))
+    term = len(signal_shark.read_termination)
+    raw = signal_shark.read_bytes(length)
+    signal_shark.read_bytes(term)
+    return raw, 2 + ndigits + length + term
+
+
+def read_trace(signal_shark, out, transfer='ascii', query=TRACE_QUERY):
+    """Fetch one trace into out using the selected transfer format.
+    Returns (bytes transferred, parse time in s)."""
+    raw, nbytes = fetch_trace(signal_shark, transfer, query)
+    return nbytes, decode_trace(raw, out, transfer)
+
+
+def bulk_command(numSweeps, query=TRACE_QUERY):
+    """One program message that runs, updates and fetches numSweeps sweeps back-to-back."""
+    return ';'.join(['RUN:SINGLE?;SPECTRUM:DATA:UPDATE?;' + query]*numSweeps)
+
+
+def fetch_bulk(signal_shark, numSweeps, numPoints, transfer='ascii', query=TRACE_QUERY):
+    """Queue numSweeps single runs in one message and read all their traces (see read_bulk)."""
+    signal_shark.write(bulk_command(numSweeps, query))
+    return read_bulk(signal_shark, numSweeps, numPoints, transfer)
+
+
+def read_bulk(signal_shark, numSweeps, numPoints, transfer='ascii'):
+    """Read the response to a bulk_command message.
+    Returns the raw response (str for ASCII, a sweeps x points float32 view of the trace blocks
+    for binary) and the bytes transferred. The RUN:SINGLE? and UPDATE? answers are skipped.
+    Every binary sweep has the same answers and block header, so after the first header the rest
+    of the response is read with a single read_bytes call and checked in place."""
+    if transfer != 'binary':
+        temp = signal_shark.read()
+        return temp, len(temp) + len(signal_shark.read_termination)
+    size = numPoints*4
+    header = ('#%i%i' % (len(str(size)), size)).encode()
+    lead = signal_shark.read_bytes(len(header))  # '0;0;' answers of RUN:SINGLE? and UPDATE?, then the header
+    while b'#' not in lead:
+        lead += signal_shark.read_bytes(len(header))
+    lead += signal_shark.read_bytes(lead.index(b'#') + len(header) - len(lead))
+    if not lead.endswith(header):
+        raise IOError('Expected a trace block of %i points, got %r' % (numPoints, lead))
+    stride = size + 1 + len(lead)  # payload, ';' and the next sweep's answers and header
+    rest = signal_shark.read_bytes((numSweeps - 1)*stride + size + len(signal_shark.read_termination))
+    heads = np.ndarray((numSweeps - 1,), dtype='S%i' % (len(lead) + 1), buffer=rest, offset=size,
+                       strides=(stride,))
+    if not np.all(heads == b';' + lead):
+        raise IOError('Bulk response out of step after sweep %i'
+                      % (np.flatnonzero(heads != b';' + lead)[0] + 1))
+    payload = np.ndarray((numSweeps, numPoints), dtype='<f4', buffer=rest, strides=(stride, 4))
+    return payload, len(lead) + len(rest)
+
+
+def decode_bulk(raw, out, transfer='ascii'):
+    """Decode a fetch_bulk response into out (sweeps x points, dBm) in one pass.
+    Returns the parse time in s."""
+    t0 = time.perf_counter()
+    if transfer == 'binary':
+        np.copyto(out, raw)
+    else:
+        fields = raw.split(';')  # RUN:SINGLE? answer, UPDATE? answer, trace for every sweep
+        if len(fields) != 3*out.shape[0]:
+            raise IOError('Bulk response holds %i answers, expected %i sweeps'
+                          % (len(fields), out.shape[0]))
+        values = np.fromstring(','.join(fields[2::3]), sep=',')  # parsed in C, no list of str
+        if values.size != out.size:
+            raise IOError('Bulk response holds %i values, expected %i sweeps of %i points'
+                          % (values.size, out.shape[0], out.shape[1]))
+        out[:] = values.reshape(out.shape)
+    return time.perf_counter() - t0
+
+
+def compare_transfer(signal_shark, numSweeps=20, numPoints=801):
+    """Capture numSweeps traces in each transfer format and print bytes/sweep, parse time and
+    wall time per sweep side by side. Leaves the analyser in ASCII mode."""
+    dataTrace = np.zeros((numSweeps, numPoints), dtype=float)
+    results = {}
+    for transfer in TRANSFER_MODES:
+        set_trace_format(signal_shark, transfer)
+        nbytes = np.zeros(numSweeps)
+        parse = np.zeros(numSweeps)
+        t0 = time.perf_counter()
+        for i in range(0, numSweeps):
+            signal_shark.query('RUN:SINGLE?')
+            signal_shark.query('SPECTRUM:DATA:UPDATE?')
+            nbytes[i], parse[i] = read_trace(signal_shark, dataTrace[i, :], transfer)
+        wall = (time.perf_counter() - t0)/numSweeps
+        results[transfer] = (np.mean(nbytes), np.mean(parse), wall)
+        print('%-6s: %8.0f bytes/sweep, parse %7.3f ms/sweep, wall %7.2f ms/sweep'
+              % (transfer, results[transfer][0], results[transfer][1]*1e3, wall*1e3))
+    set_trace_format(signal_shark, 'ascii')
+    saved = (results['ascii'][2] - results['binary'][2])*numSweeps
+    print('Binary transfer saves %.2f s per %i sweep load state' % (saved, numSweeps))
+    return results
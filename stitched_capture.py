@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Multi-span stitched capture for the SignalShark. Instead of one 368-1168 MHz IF span at a single
+RBW, the IF range is swept as several sub-spans: fine RBW and long measurement time over the IF
+image of the band's sky window (4917-5045 MHz for B1, 6550-6950 MHz for B2) and coarse RBW with a
+short measurement time outside it. The sub-spans are merged into one frequency-sorted trace.
+
+A span is (f_start, f_stop, Rbw, meas_time) in MHz, MHz, MHz and ms, as in AnalyserConfig.
+Where spans overlap, the points of the span with the finer RBW are kept (equal RBW: the earlier
+span wins, so a shared edge appears once). Powers are scaled to the reference RBW (Rbw_ref) so
+the analysis scripts can keep using one Rbw for the gain calculation.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import os
+
+import numpy as np
+
+import spectrum_analyser as sa
+import sweep_acquisition as acq
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+SKY_BANDS = {'B1': (4917, 5045), 'B2': (6550, 6950)}  # sky frequencies (MHz) evaluated per band
+# IF (MHz) = LO_SIGN*(sky - LO): B1 is inverted (sky = 5749 - IF), B2 is not (sky = 5982 + IF)
+LO = {'B1': (5749, -1), 'B2': (5982, 1)}
+
+
+#%%
+def sky_to_if(band, f_sky):
+    """IF frequency (MHz) of a sky frequency (MHz) for the band, e.g. 'B1LCP'."""
+    lo, sign = LO[band[:2]]
+    return sign*(f_sky - lo)
+
+
+def span_plan(band, f_start=368, f_stop=1168, fine_Rbw=0.5, coarse_Rbw=2, fine_meas_time=100,
+              coarse_meas_time=20):
+    """Spans covering f_start..f_stop (IF, MHz): fine over the band's sky window, coarse outside."""
+    fine = sorted(sky_to_if(band, f) for f in SKY_BANDS[band[:2]])
+    spans = []
+    if fine[0] > f_start:
+        spans.append((f_start, fine[0], coarse_Rbw, coarse_meas_time))
+    spans.append((fine[0], fine[1], fine_Rbw, fine_meas_time))
+    if fine[1] < f_stop:
+        spans.append((fine[1], f_stop, coarse_Rbw, coarse_meas_time))
+    return spans
+
+
+def merge_plan(freqs, Rbws):
+    """Which points of every span go into the stitched trace and in what order.
+    freqs is a list of per-span frequency axes, Rbws the span RBWs. A point is dropped if a span
+    with a finer RBW (or an earlier span with the same RBW) covers its frequency.
+    Returns (per-span boolean masks, sort order of the concatenated kept points)."""
+    keep = []
+    for j, (f, Rbw) in enumerate(zip(freqs, Rbws)):
+        mask = np.ones(len(f), dtype=bool)
+        for m, (g, other) in enumerate(zip(freqs, Rbws)):
+            if m != j and (other < Rbw or (other == Rbw and m < j)):
+                mask &= ~((f >= g[0]) & (f <= g[-1]))
+        keep.append(mask)
+    order = np.argsort(np.concatenate([f[mask] for f, mask in zip(freqs, keep)]), kind='stable')
+    return keep, order
+
+
+def stitch(arrays, keep, order, scale=None):
+    """Merge per-span (sweeps x points) arrays, or 1-D axes, into one frequency-sorted array.
+    scale multiplies each span's values (e.g. Rbw_ref/Rbw for linear power)."""
+    scale = scale or [1.0]*len(arrays)
+    parts = [a[..., mask]*s for a, mask, s in zip(arrays, keep, scale)]
+    return np.concatenate(parts, axis=-1)[..., order]
+
+
+def capture_stitched(signal_shark, name, spans, numSweeps, transfer='binary', pipelined=True,
+                     Atten=10, Rbw_ref=2, resume=False, verbose=True, dtype=float):
+    """Capture numSweeps sweeps of every span and save the stitched linear power (W, scaled to
+    Rbw_ref MHz, stored in dtype) as <name>.npy. Each span is kept as <name>_span<j>.npy; with resume=True spans
+    that are already on disk are not captured again. Returns (freq in Hz, power array)."""
+    freqs, powers, Rbws = [], [], []
+    for j, (f_start, f_stop, Rbw, meas_time) in enumerate(spans):
+        span_name = '%s_span%i' % (name, j)
+        sa.AnalyserConfig(f_start, f_stop, Rbw, meas_time, Atten).apply(signal_shark)
+        acq.trigger_sweep(signal_shark)  # the point count is valid after the first sweep
+        freq = sa.frequency_axis(signal_shark)
+        if resume and os.path.exists(span_name + '.npy'):
+            Pout = np.load(span_name + '.npy')
+            print('%s: using %i stored sweeps' % (span_name, Pout.shape[0]))
+        else:
+            sa.set_trace_format(signal_shark, transfer)
+            dataTrace = np.zeros((numSweeps, len(freq)), dtype=dtype)
+            store = acq.SweepStore(span_name, numSweeps, len(freq), resume, dtype)
+            acq.acquire_sweeps(signal_shark, dataTrace, transfer, pipelined,
+                               label='%s %g-%g MHz' % (os.path.basename(name), f_start, f_stop),
+                               verbose=verbose, start=store.completed, on_sweep=store.append,
+                               telemetry=store.telemetry)
+            Pout = store.finalise()
+        freqs.append(freq)
+        powers.append(Pout)
+        Rbws.append(Rbw)
+    keep, order = merge_plan(freqs, Rbws)
+    freq = stitch(freqs, keep, order)
+    Pout = stitch(powers, keep, order, [Rbw_ref/Rbw for Rbw in Rbws])
+    np.save(name, Pout)
+    print('%s: %i spans stitched into %i points' % (name, len(spans), len(freq)))
+    return freq, Pout
@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Sweep acquisition engine for the SignalShark capture scripts.
+Sequentially every sweep needs three blocking round trips (RUN:SINGLE?, SPECTRUM:DATA:UPDATE?
+and SPEC:DATA:LEVel? RMS). In pipelined mode a dedicated I/O thread sends the three as one ';'
+chained message per sweep and keeps the next sweep's message queued on the analyser before it
+reads the current trace, so the analyser runs sweep i+1 while trace i is transferred, and hands
+the raw trace to the calling thread through a bounded queue, which decodes and stores it.
+
+SweepStore streams each completed sweep to a pre-sized memory-mapped .npy next to the final
+_hot/_cold file, with a completed-sweep counter, so a dropped socket only loses the sweep in
+flight and the load state can be resumed from the last good sweep.
+
+acquire_averaged lets the SignalShark do the averaging (SPECTRUM:SCAN:COUNT with RMS averaging)
+so only one averaged trace per block of sweeps crosses the network. capture_averaged stores the
+block averages as <name>.npy, marked by a <name>_averaging.json sidecar (lazy_loader.averaging) so
+nothing downstream takes the rows for sweeps, and can keep a few individual sweeps in
+<name>_raw.npy. acquire_bulk keeps every sweep but fetches a batch of them per round trip.
+
+Telemetry records the wall-clock timestamp, the RUN:SINGLE?, UPDATE? and fetch latencies, the
+payload size and the decode time of every sweep. SweepStore writes it as <name>_telemetry.json
+next to the _hot/_cold file, with sweeps/s and the fraction of the capture the analyser sat idle.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import lazy_loader as ll
+import spectrum_analyser as sa
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+queue_depth = 4  # number of raw traces the I/O thread may run ahead of the decoder
+sweeps_ahead = 1  # sweeps queued on the analyser beyond the one being read (0 = one message at a time)
+# Commands that select RMS (linear power) averaging of the scans in SPECTRUM:SCAN:COUNT
+AVERAGING_COMMANDS = ('SPECTRUM:AVERAGE:TYPE RMS',)
+RAW_SUFFIX = '_raw'  # individual sweeps kept next to an averaged capture
+
+
+#%%
+def trigger_sweep(signal_shark):
+    """Run one single measurement and update the trace data on the analyser.
+    Returns the RUN:SINGLE? and SPECTRUM:DATA:UPDATE? latencies (s)."""
+    t0 = time.perf_counter()
+    signal_shark.query('RUN:SINGLE?')  # returns 0 on completion
+    t1 = time.perf_counter()
+    signal_shark.query('SPECTRUM:DATA:UPDATE?')
+    return t1 - t0, time.perf_counter() - t1
+
+
+class Telemetry(object):
+    """Per-sweep timing of one capture. Latencies are in s, nbytes is the trace payload size and
+    timestamp the wall-clock (Unix) time the sweep was triggered. Latencies that a capture mode
+    does not measure separately (RUN:SINGLE? and UPDATE? in pipelined and bulk mode) are None."""
+
+    FIELDS = ('sweep', 'timestamp', 'run_s', 'update_s', 'fetch_s', 'nbytes', 'decode_s')
+
+    def __init__(self):
+        self.sweeps = []
+        self.t_start = None
+        self.t_stop = None
+
+    def start(self):
+        if self.t_start is None:
+            self.t_start = time.time()
+
+    def record(self, i, timestamp, run_s, update_s, fetch_s, nbytes, decode_s):
+        self.sweeps.append((i, timestamp, run_s, update_s, fetch_s, nbytes, decode_s))
+        self.t_stop = time.time()
+
+    def column(self, field):
+        return [sweep[self.FIELDS.index(field)] for sweep in self.sweeps]
+
+    def summary(self):
+        """Sweeps/s over the capture, mean latencies and the idle fraction: the share of the
+        capture wall time in which the analyser was not running a sweep (RUN:SINGLE?)."""
+        n = len(self.sweeps)
+        elapsed = (self.t_stop - self.t_start) if n else 0.0
+        result = {'sweeps': n, 'elapsed_s': elapsed,
+                  'sweeps_per_s': n/elapsed if elapsed else None,
+                  'bytes': int(sum(self.column('nbytes')))}
+        for field in ('run_s', 'update_s', 'fetch_s', 'decode_s'):
+            values = [v for v in self.column(field) if v is not None]
+            result['mean_'+field] = float(np.mean(values)) if values else None
+        run = [v for v in self.column('run_s') if v is not None]
+        result['idle_fraction'] = max(1 - sum(run)/elapsed, 0.0) if run and elapsed else None
+        return result
+
+    def save(self, name):
+        """Write the per-sweep records and the summary to <name>_telemetry.json and print the summary."""
+        summary = self.summary()
+        with open(name + '_telemetry.json', 'w') as f:
+            json.dump({'summary': summary, 'fields': self.FIELDS, 'sweeps': self.sweeps}, f, indent=1)
+        if summary['sweeps']:
+            print('%s: %i sweeps at %.2f sweeps/s, %i bytes, idle %s'
+                  % (name, summary['sweeps'], summary['sweeps_per_s'] or 0, summary['bytes'],
+                     '-' if summary['idle_fraction'] is None else '%.0f%%' % (100*summary['idle_fraction'])))
+        return summary
+
+
+def telemetry_report(pattern='*/*_telemetry.json'):
+    """Print one line per telemetry sidecar matching pattern, e.g. to compare campaigns.
+    Returns {file name: summary}."""
+    results = {}
+    print('%-50s %7s %9s %9s %9s %9s %6s' % ('capture', 'sweeps', 'sweeps/s', 'run ms', 'fetch ms', 'parse ms', 'idle'))
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            summary = json.load(f)['summary']
+        results[path] = summary
+        ms = lambda v: '-' if v is None else '%.2f' % (v*1e3)
+        print('%-50s %7i %9.2f %9s %9s %9s %6s'
+              % (path[:-len('_telemetry.json')], summary['sweeps'], summary['sweeps_per_s'] or 0,
+                 ms(summary['mean_run_s']), ms(summary['mean_fetch_s']), ms(summary['mean_decode_s']),
+                 '-' if summary['idle_fraction'] is None else '%.0f%%' % (100*summary['idle_fraction'])))
+    return results
+
+
+def _io_thread(signal_shark, start, numSweeps, numPoints, transfer, traces, stop):
+    """Trigger and fetch sweeps start..numSweeps-1 with one chained RUN:SINGLE? / UPDATE? / trace
+    message per sweep, keeping sweeps_ahead further messages queued on the analyser so it starts the
+    next sweep as soon as it has sent a trace. Puts (i, raw, nbytes, timing) on the traces queue,
+    with timing = (timestamp the message was sent, None, None, wait for the response).
+    Errors are passed on through the queue; None marks the end of the sweeps."""
+    command = sa.bulk_command(1)
+    sent = []  # send timestamps of the messages whose response has not been read
+    try:
+        j = start
+        for i in range(start, numSweeps):
+            if stop.is_set():
+                break
+            while j < min(i + 1 + sweeps_ahead, numSweeps):
+                signal_shark.write(command)
+                sent.append(time.time())
+                j += 1
+            t0 = time.perf_counter()
+            raw, nbytes = sa.read_bulk(signal_shark, 1, numPoints, transfer)
+            timing = (sent.pop(0), None, None, time.perf_counter() - t0)
+            while not stop.is_set():
+                try:
+                    traces.put((i, raw, nbytes, timing), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+        for _ in sent:  # sweeps already queued when the caller stopped
+            sa.read_bulk(signal_shark, 1, numPoints, transfer)
+    except Exception as err:
+        traces.put(err)
+    traces.put(None)
+
+
+def acquire_sweeps(signal_shark, dataTrace, transfer='ascii', pipelined=True, label='', verbose=True,
+                   start=0, on_sweep=None, batch=None, telemetry=None):
+    """Fill dataTrace (numSweeps x numPoints, dBm) with one sweep per row, starting at row start.
+    on_sweep(i, dataTrace[i, :]) is called as soon as each sweep is stored (e.g. SweepStore.append);
+    if it returns True no further sweeps are taken. With batch set, batch sweeps are fetched per
+    round trip (acquire_bulk) instead of one. The timing of every sweep is recorded in telemetry
+    (a Telemetry, e.g. SweepStore.telemetry) if given.
+    label is used in the progress line, e.g. 'Tref_cold'. Returns the measured sweeps/s."""
+    if batch:
+        return acquire_bulk(signal_shark, dataTrace, transfer, batch, label, verbose, start, on_sweep,
+                            telemetry=telemetry)
+    numSweeps = dataTrace.shape[0]
+    done = 0
+    t0 = time.perf_counter()
+    if telemetry is not None:
+        telemetry.start()
+    if not pipelined:
+        for i in range(start, numSweeps):
+            timestamp = time.time()
+            run_s, update_s = trigger_sweep(signal_shark)
+            t1 = time.perf_counter()
+            nbytes, parse_time = sa.read_trace(signal_shark, dataTrace[i, :], transfer)
+            if telemetry is not None:
+                telemetry.record(i, timestamp, run_s, update_s, time.perf_counter() - t1 - parse_time,
+                                 nbytes, parse_time)
+            done += 1
+            if verbose:
+                print("%s measurement # %i of %i (%i bytes, parse %.2f ms)"
+                      % (label, i+1, numSweeps, nbytes, parse_time*1e3))
+            if on_sweep is not None and on_sweep(i, dataTrace[i, :]):
+                break
+    else:
+        traces = queue.Queue(maxsize=queue_depth)
+        stop = threading.Event()
+        worker = threading.Thread(target=_io_thread,
+                                  args=(signal_shark, start, numSweeps, dataTrace.shape[1], transfer, traces,
+                                        stop),
+                                  daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = traces.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                i, raw, nbytes, timing = item
+                parse_time = sa.decode_bulk(raw, dataTrace[i:i+1, :], transfer)
+                if telemetry is not None:
+                    telemetry.record(i, *timing, nbytes=nbytes, decode_s=parse_time)
+                done += 1
+                if verbose:
+                    print("%s measurement # %i of %i (%i bytes, parse %.2f ms)"
+                          % (label, i+1, numSweeps, nbytes, parse_time*1e3))
+                if on_sweep is not None and on_sweep(i, dataTrace[i, :]):
+                    break
+        finally:
+            stop.set()
+            while worker.is_alive():  # drain so the I/O thread is never left blocked on a full queue
+                try:
+                    traces.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+    rate = done/(time.perf_counter() - t0)
+    if verbose:
+        print('%s: %i sweeps at %.2f sweeps/s' % (label, done, rate))
+    return rate
+
+
+def acquire_averaged(signal_shark, dataTrace, numSweeps, transfer='ascii', pipelined=True, label='',
+                     verbose=True, start=0, on_sweep=None, telemetry=None):
+    """Average numSweeps sweeps on the analyser and transfer one trace per row of dataTrace.
+    With one row the whole state is a single averaged trace. With more rows (blocks) each row
+    is the average of numSweeps/rows sweeps; the block averages keep a subsampled view of the
+    sweep to sweep scatter for variance estimation and their mean equals the full average.
+    Returns the sweeps/s equivalent (averaged sweeps per second)."""
+    blocks = dataTrace.shape[0]
+    if numSweeps % blocks:
+        raise ValueError('numSweeps (%i) must be a multiple of the number of blocks (%i)' % (numSweeps, blocks))
+    for command in AVERAGING_COMMANDS:
+        signal_shark.write(command)
+    signal_shark.write('SPECTRUM:SCAN:COUNT %i' % (numSweeps//blocks))
+    try:
+        rate = acquire_sweeps(signal_shark, dataTrace, transfer, pipelined, label, verbose, start, on_sweep,
+                              telemetry=telemetry)
+    finally:
+        signal_shark.write('SPECTRUM:SCAN:COUNT 1')
+    return rate*(numSweeps//blocks)
+
+
+def capture_averaged(signal_shark, name, numSweeps, blocks, numPoints, raw_sweeps=0, transfer='ascii',
+                     pipelined=True, label='', verbose=True, resume=False, dtype=float, on_sweep=None):
+    """Capture one load state with acquire_averaged into <name>.npy (blocks rows, each the average
+    of numSweeps/blocks sweeps) and write <name>_averaging.json. With raw_sweeps, that many
+    individual sweeps are taken afterwards into <name>_raw.npy for the statistics that need
+    sweeps. on_sweep sees the block averages. Returns the block averaged power array (W)."""
+    store = SweepStore(name, blocks, numPoints, resume, dtype)
+    store.replay(on_sweep)
+    acquire_averaged(signal_shark, np.zeros((blocks, numPoints), dtype=dtype), numSweeps, transfer, pipelined,
+                     label, verbose, start=store.completed, on_sweep=chain_callbacks(store.append, on_sweep),
+                     telemetry=store.telemetry)
+    raw_file = None
+    if raw_sweeps:
+        raw = SweepStore(name + RAW_SUFFIX, raw_sweeps, numPoints, resume, dtype)
+        acquire_sweeps(signal_shark, np.zeros((raw_sweeps, numPoints), dtype=dtype), transfer, pipelined,
+                       label + ' raw', verbose, start=raw.completed, on_sweep=raw.append, telemetry=raw.telemetry)
+        raw.finalise()
+        raw_file = os.path.basename(name + RAW_SUFFIX + '.npy')
+    Pout = store.finalise()
+    with open(name + ll.AVERAGING_SUFFIX, 'w') as f:
+        json.dump({'blocks': blocks, 'sweeps_per_block': numSweeps//blocks, 'sweeps': numSweeps,
+                   'raw_sweeps': raw_sweeps, 'raw_file': raw_file}, f, indent=1)
+    return Pout
+
+
+def acquire_bulk(signal_shark, dataTrace, transfer='ascii', batch=None, label='', verbose=True,
+                 start=0, on_sweep=None, sweep_timeout=2000, telemetry=None):
+    """Fill dataTrace (numSweeps x numPoints, dBm) by queueing batch single runs per program
+    message (all remaining sweeps by default) and decoding each batch in one pass. Every sweep is
+    kept. The VISA timeout is raised by sweep_timeout ms per queued sweep while a batch runs.
+    on_sweep is called for every sweep of a batch; if it returns True no further batch is queued.
+    In telemetry each sweep of a batch gets the batch timestamp and an equal share of the batch
+    round trip, bytes and decode time. Returns the measured sweeps/s."""
+    numSweeps, numPoints = dataTrace.shape
+    batch = batch or numSweeps
+    timeout = signal_shark.timeout
+    t0 = time.perf_counter()
+    if telemetry is not None:
+        telemetry.start()
+    i = start
+    try:
+        while i < numSweeps:
+            n = min(batch, numSweeps - i)
+            signal_shark.timeout = timeout + n*sweep_timeout
+            timestamp = time.time()
+            t1 = time.perf_counter()
+            raw, nbytes = sa.fetch_bulk(signal_shark, n, numPoints, transfer)
+            fetch_s = time.perf_counter() - t1
+            parse_time = sa.decode_bulk(raw, dataTrace[i:i+n, :], transfer)
+            if telemetry is not None:
+                for j in range(i, i+n):
+                    telemetry.record(j, timestamp, None, None, fetch_s/n, nbytes//n, parse_time/n)
+            if verbose:
+                print("%s measurements # %i-%i of %i (%i bytes, parse %.2f ms)"
+                      % (label, i+1, i+n, numSweeps, nbytes, parse_time*1e3))
+            stop = False
+            for j in range(i, i+n):
+                if on_sweep is not None:
+                    stop = bool(on_sweep(j, dataTrace[j, :])) or stop
+            i += n
+            if stop:
+                break
+    finally:
+        signal_shark.timeout = timeout
+    rate = (i - start)/(time.perf_counter() - t0)
+    if verbose:
+        print('%s: %i sweeps at %.2f sweeps/s' % (label, i - start, rate))
+    return rate
+
+
+def chain_callbacks(*callbacks):
+    """Combine several on_sweep callbacks (None entries are skipped). All are called for every
+    sweep and acquisition stops if any of them returns True."""
+    callbacks = [c for c in callbacks if c is not None]
+
+    def on_sweep(i, trace):
+        stop = False
+        for callback in callbacks:
+            stop = bool(callback(i, trace)) or stop
+        return stop
+    return on_sweep
+
+
+class SweepStore(object):
+    """Crash-safe store for one load state, e.g. SweepStore(band+'/'+band+'_'+meas+'_cold', 20, 801).
+    Sweeps are written as linear power (W) into <name>_partial.npy as they arrive and the number of
+    completed sweeps is kept in <name>_partial.count. finalise() renames the file to <name>.npy,
+    the same file the analysis scripts load and writes the timing of the sweeps taken in this session
+    (telemetry, pass it to acquire_sweeps) to <name>_telemetry.json. With resume=True an existing
+    partial file is reopened and acquisition carries on from the last completed sweep.
+    dtype is the stored precision: float32 (pass dataTrace.dtype) halves the file size."""
+
+    def __init__(self, name, numSweeps, numPoints, resume=False, dtype=float):
+        self.name = name
+        self.path = name + '_partial.npy'
+        self.count_path = name + '_partial.count'
+        self.completed = 0
+        self.telemetry = Telemetry()
+        if resume and os.path.exists(self.path) and os.path.exists(self.count_path):
+            self.Pout = np.lib.format.open_memmap(self.path, mode='r+')
+            if self.Pout.shape != (numSweeps, numPoints):
+                raise ValueError('%s holds %s sweeps x points, expected %s'
+                                 % (self.path, self.Pout.shape, (numSweeps, numPoints)))
+            with open(self.count_path) as f:
+                self.completed = int(f.read())
+            print('Resuming %s at sweep # %i of %i' % (name, self.completed+1, numSweeps))
+        else:
+            self.Pout = np.lib.format.open_memmap(self.path, mode='w+', dtype=dtype,
+                                                  shape=(numSweeps, numPoints))
+            self._write_count()
+
+    def _write_count(self):
+        tmp = self.count_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('%i' % self.completed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.count_path)  # atomic, so the counter is never half written
+
+    def append(self, i, trace):
+        """Store sweep i (dBm) as linear power and advance the completed-sweep counter."""
+        self.Pout[i, :] = 10**(trace/10)*1e-3  # Convert to linear power (W)
+        self.Pout.flush()
+        self.completed = i + 1
+        self._write_count()
+
+    def replay(self, on_sweep):
+        """Call on_sweep(i, trace) (dBm) for the sweeps completed before a resume."""
+        if on_sweep is not None:
+            for i in range(0, self.completed):
+                on_sweep(i, 10*np.log10(self.Pout[i, :]/1e-3))
+
+    def restore(self, dataTrace):
+        """Copy the sweeps completed before a resume back into dataTrace (dBm)."""
+        dataTrace[:self.completed, :] = 10*np.log10(self.Pout[:self.completed, :]/1e-3)
+
+    def finalise(self, minSweeps=None, mmap_mode=None):
+        """Check the sweeps are in, move the file to <name>.npy and return the power array (W).
+        With minSweeps set (adaptive sweep count) a capture that stopped early after at least
+        minSweeps sweeps is saved with only the completed sweeps. mmap_mode is passed to np.load."""
+        numSweeps = self.Pout.shape[0]
+        if self.completed < (numSweeps if minSweeps is None else minSweeps):
+            raise RuntimeError('%s has only %i of %i sweeps, capture again with resume=True'
+                               % (self.path, self.completed, numSweeps))
+        if self.completed < numSweeps:
+            np.save(self.name, self.Pout[:self.completed, :])
+            del self.Pout
+            os.remove(self.path)
+        else:
+            self.Pout.flush()
+            del self.Pout
+            os.replace(self.path, self.name + '.npy')
+        os.remove(self.count_path)
+        if os.path.exists(self.name + ll.AVERAGING_SUFFIX):  # left by an earlier averaged capture of this state
+            os.remove(self.name + ll.AVERAGING_SUFFIX)
+        if self.telemetry.sweeps:
+            self.telemetry.save(self.name)
+        return np.load(self.name + '.npy', mmap_mode=mmap_mode)
+
+
+def benchmark_averaging(signal_shark, numSweeps=20, numPoints=801, transfer='ascii', blocks=1):
+    """Compare per-sweep transfer with on-instrument averaging for wall time and bytes moved (the
+    trace bytes read, as counted by the telemetry). Returns {mode: (wall time in s, bytes)}."""
+    sa.set_trace_format(signal_shark, transfer)
+    results = {}
+    for mode, rows in (('per-sweep', numSweeps), ('averaged', blocks)):
+        dataTrace = np.zeros((rows, numPoints), dtype=float)
+        telemetry = Telemetry()
+        t0 = time.perf_counter()
+        if mode == 'per-sweep':
+            acquire_sweeps(signal_shark, dataTrace, transfer, verbose=False, telemetry=telemetry)
+        else:
+            acquire_averaged(signal_shark, dataTrace, numSweeps, transfer, verbose=False, telemetry=telemetry)
+        results[mode] = (time.perf_counter() - t0, telemetry.summary()['bytes'])
+        print('%-9s: %i sweeps in %.2f s, %i traces, %i bytes'
+              % (mode, numSweeps, results[mode][0], len(telemetry.sweeps), results[mode][1]))
+    return results
+
+
+def benchmark_bulk(signal_shark, sweep_counts=(20, 200, 2000), numPoints=801, transfer='ascii', batch=None):
+    """Compare per-sweep round trips with bulk retrieval at several sweep counts (sweeps/s).
+    Against the simulator use sweep_time=0, so the transfer rather than the sweep is timed, and a
+    turnaround for the network round trip of the real analyser."""
+    sa.set_trace_format(signal_shark, transfer)
+    results = {}
+    for numSweeps in sweep_counts:
+        dataTrace = np.zeros((numSweeps, numPoints), dtype=float)
+        per_sweep = acquire_sweeps(signal_shark, dataTrace, transfer, pipelined=False, verbose=False)
+        bulk = acquire_bulk(signal_shark, dataTrace, transfer, batch, verbose=False)
+        results[numSweeps] = (per_sweep, bulk)
+        print('%5i sweeps: per-sweep %8.2f sweeps/s, bulk %8.2f sweeps/s (%.2fx)'
+              % (numSweeps, per_sweep, bulk, bulk/per_sweep))
+    return results
+
+
+def benchmark_acquisition(signal_shark, numSweeps=20, numPoints=801, transfer='ascii'):
+    """Measure sweeps/s for the sequential loop and the pipelined engine on the same connection."""
+    dataTrace = np.zeros((numSweeps, numPoints), dtype=float)
+    sa.set_trace_format(signal_shark, transfer)
+    before = acquire_sweeps(signal_shark, dataTrace, transfer, pipelined=False, verbose=False)
+    after = acquire_sweeps(signal_shark, dataTrace, transfer, pipelined=True, verbose=False)
+    print('sequential: %.2f sweeps/s, pipelined: %.2f sweeps/s (%.2fx)' % (before, after, after/before))
+    return before, after
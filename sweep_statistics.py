@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Online per-bin statistics for sweeps as they arrive from the SignalShark.
+RunningStats keeps a running mean and variance per frequency bin (Welford's method), so
+nothing has to re-scan dataTrace after each sweep.
+
+AdaptiveStop uses those statistics to stop a load state as soon as the projected Y-factor Teff
+uncertainty over the analysis window drops below a target in kelvin. For the first state (hot)
+the other load is not measured yet, so its relative error is assumed equal and Y is projected
+from an expected Teff; once the hot file exists it is used for the cold state.
+
+LiveYFactor updates the per-bin Y-factor Teff and gain from the stored hot state and the running
+cold mean after every cold sweep, so a bad result shows up while the setup is still in place.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import json
+
+import numpy as np
+
+import lazy_loader as ll
+import robust_average as ra
+import sweep_acquisition as acq
+import y_factor as yf
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+# Analysis window (data_s, data_f) per band on the 801 point, 1 MHz grid, as used by the Mk2 analysis scripts
+ANALYSIS_WINDOW = {'B1': (336, 464), 'B2': (200, 600)}
+REFERENCE_POINTS = 801  # point count ANALYSIS_WINDOW is defined for
+ANALYSIS_WINDOW_IF = {'B1': (704e6, 832e6), 'B2': (568e6, 968e6)}  # the same windows in IF (Hz)
+
+
+#%%
+def analysis_window(band, numPoints=REFERENCE_POINTS, freq=None):
+    """ANALYSIS_WINDOW of the band (e.g. 'B1LCP') scaled to a trace of numPoints points over the
+    same span, so e.g. 8001 point captures average over the same frequencies. With freq (Hz) the
+    window is looked up by frequency instead, which also works for a stitched grid."""
+    if freq is not None:
+        return tuple(int(i) for i in np.searchsorted(freq, ANALYSIS_WINDOW_IF[band[:2]]))
+    data_s, data_f = ANALYSIS_WINDOW[band[:2]]
+    return (data_s*(numPoints-1)//(REFERENCE_POINTS-1), data_f*(numPoints-1)//(REFERENCE_POINTS-1))
+
+
+class RunningStats(object):
+    """Per-bin running mean and variance of linear power, updated one sweep at a time."""
+
+    def __init__(self, numPoints):
+        self.n = 0
+        self.mean = np.zeros(numPoints)
+        self.m2 = np.zeros(numPoints)  # sum of squared deviations from the mean
+
+    @classmethod
+    def from_array(cls, Pout):
+        """Statistics of a stored sweeps x points power array. A LazyArray of on-instrument block
+        averages is rescaled to its sweeps: n sweeps in all and a per sweep variance of
+        sweeps_per_block x the block to block variance (which needs at least 2 blocks)."""
+        stats = cls(Pout.shape[1])
+        info = Pout.averaging if isinstance(Pout, ll.LazyArray) else None
+        stats.mean = np.mean(Pout, axis=0)
+        if info is None:
+            stats.n = Pout.shape[0]
+            stats.m2 = np.var(Pout, axis=0)*stats.n
+            return stats
+        if Pout.shape[0] < 2:
+            raise ValueError('%s is a single average of %i sweeps, its sweep to sweep variance is unknown'
+                             % (Pout.path, info['sweeps']))
+        stats.n = Pout.shape[0]*info['sweeps_per_block']
+        stats.m2 = np.var(Pout, axis=0, ddof=1)*info['sweeps_per_block']*(stats.n - 1)
+        return stats
+
+    def update(self, power):
+        self.n += 1
+        delta = power - self.mean
+        self.mean += delta/self.n
+        self.m2 += delta*(power - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2/max(self.n - 1, 1)
+
+    def window_mean(self, data_s, data_f):
+        return np.mean(self.mean[data_s:data_f])
+
+    def window_error(self, data_s, data_f):
+        """Relative standard error of the window averaged power (bins taken as independent)."""
+        se = np.sqrt(np.sum(self.variance[data_s:data_f])/self.n)/(data_f - data_s)
+        return se/self.window_mean(data_s, data_f)
+
+
+def teff_uncertainty(Y, r_hot, r_cold, Tref_hot, Tref_cold):
+    """1 sigma uncertainty (K) of Teff=(Tref_hot-Tref_cold*Y)/(Y-1) for relative power errors
+    r_hot and r_cold of the hot and cold load measurements."""
+    return (Tref_hot - Tref_cold)*Y*np.sqrt(r_hot**2 + r_cold**2)/(Y - 1)**2
+
+
+class AdaptiveStop(object):
+    """on_sweep callback that returns True once the projected Teff uncertainty over the window
+    is below teff_target (K) and at least minSweeps sweeps were taken.
+    load is 'hot' or 'cold'; reference is the other load's stored power array, if available."""
+
+    def __init__(self, numPoints, window, load, Tref_hot, Tref_cold, teff_target, minSweeps=5,
+                 reference=None, expected_teff=80.0):
+        self.stats = RunningStats(numPoints)
+        self.data_s, self.data_f = window
+        self.load = load
+        self.Tref_hot = Tref_hot
+        self.Tref_cold = Tref_cold
+        self.teff_target = teff_target
+        self.minSweeps = minSweeps
+        self.expected_teff = expected_teff
+        self.reference = None if reference is None else RunningStats.from_array(reference)
+        self.uncertainty = np.inf
+
+    def projected_uncertainty(self):
+        r = self.stats.window_error(self.data_s, self.data_f)
+        if self.reference is None:
+            Y = (self.Tref_hot + self.expected_teff)/(self.Tref_cold + self.expected_teff)
+            r_other = r
+        else:
+            p_this = self.stats.window_mean(self.data_s, self.data_f)
+            p_other = self.reference.window_mean(self.data_s, self.data_f)
+            Y = p_this/p_other if self.load == 'hot' else p_other/p_this
+            r_other = self.reference.window_error(self.data_s, self.data_f)
+        return teff_uncertainty(Y, r, r_other, self.Tref_hot, self.Tref_cold)
+
+    def __call__(self, i, trace):
+        self.stats.update(10**(trace/10)*1e-3)  # Convert to linear power (W)
+        if self.stats.n < max(self.minSweeps, 2):
+            return False
+        self.uncertainty = self.projected_uncertainty()
+        return self.uncertainty < self.teff_target
+
+    def save(self, name):
+        """Write the sweeps used and the achieved uncertainty next to <name>.npy."""
+        with open(name + '_adaptive.json', 'w') as f:
+            json.dump({'numSweeps': self.stats.n,
+                       'teff_uncertainty_K': float(self.uncertainty),
+                       'teff_target_K': self.teff_target,
+                       'window': [self.data_s, self.data_f]}, f, indent=1)
+
+
+class LiveYFactor(object):
+    """on_sweep callback for the cold load: after each sweep the running cold mean is combined
+    with the averaged hot state to give per-bin Teff (K) and gain (dB), and the band averaged Teff
+    over the window is printed. Each update is one y_factor pass over the bins, so it adds nothing
+    measurable to the sweep time. Rbw is in Hz and atten in dB (negative), as in the analysis scripts."""
+
+    def __init__(self, Pout_hot, window, Tref_hot, Tref_cold, Rbw, atten=0.0, verbose=True):
+        self.avePout_hot = ra.sweep_average(Pout_hot)[0]  # averaged as y_factor does
+        self.cold = RunningStats(Pout_hot.shape[1])
+        self.data_s, self.data_f = window
+        self.Tref_hot = Tref_hot
+        self.Tref_cold = Tref_cold
+        self.Rbw = Rbw
+        self.atten = atten
+        self.verbose = verbose
+        self.dutT = None
+        self.dutG_dB = None
+        self.band_teff = np.nan
+
+    def __call__(self, i, trace):
+        self.cold.update(10**(trace/10)*1e-3)  # Convert to linear power (W)
+        result = yf.y_factor_from_means(self.avePout_hot, self.cold.mean, self.Tref_hot, self.Tref_cold,
+                                        self.atten, self.Rbw)
+        self.dutT = result['dutT']
+        self.dutG_dB = result['dutG_dB']
+        self.band_teff = np.mean(self.dutT[self.data_s:self.data_f])
+        if self.verbose:
+            print('live after %i cold sweeps: Teff = %.2f K, gain = %.2f dB (mean over bins %i:%i)'
+                  % (self.cold.n, self.band_teff, np.mean(self.dutG_dB[self.data_s:self.data_f]),
+                     self.data_s, self.data_f))
+        return False
+
+
+def adaptive_capture(signal_shark, name, dataTrace, load, window, Tref_hot, Tref_cold, teff_target,
+                     minSweeps=5, reference=None, transfer='ascii', pipelined=True, resume=False,
+                     verbose=True, monitor=None):
+    """Capture one load state with an adaptive sweep count. dataTrace is sized for the maximum
+    number of sweeps. The power array (W) is saved as <name>.npy with the sweeps actually used and
+    the achieved uncertainty in <name>_adaptive.json. monitor is an extra on_sweep callback
+    (e.g. LiveYFactor). Returns the power array."""
+    maxSweeps, numPoints = dataTrace.shape
+    store = acq.SweepStore(name, maxSweeps, numPoints, resume, dataTrace.dtype)
+    stop = AdaptiveStop(numPoints, window, load, Tref_hot, Tref_cold, teff_target, minSweeps, reference)
+    store.replay(acq.chain_callbacks(monitor, stop))  # sweeps kept from an interrupted capture
+
+    acq.acquire_sweeps(signal_shark, dataTrace, transfer, pipelined, label=name, verbose=verbose,
+                       start=store.completed, on_sweep=acq.chain_callbacks(store.append, monitor, stop),
+                       telemetry=store.telemetry)
+    Pout = store.finalise(minSweeps)
+    stop.save(name)
+    print('%s: %i sweeps, projected Teff uncertainty %.3f K (target %.3f K)'
+          % (name, stop.stats.n, stop.uncertainty, teff_target))
+    return Pout
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created: 18 October 2026
+Y-factor noise temperature and gain, as calculated by the analysis scripts (method as described
+in EA-MK-000-DREP-09_2), in one array pass over all frequency bins:
+    Y = P_hot/P_cold
+    measTeff = (Tref_hot - Tref_cold*Y)/(Y - 1)
+    dutT = measTeff*attenG - attenT*attenG
+    dutG = (P_hot/(k*Rbw) - P_cold/(k*Rbw))/(Tref_hot*attenG - Tref_cold)
+
+The power stacks are (..., sweeps, bins) in W. Any leading axes are batch axes (chains,
+campaigns, repeated measurements) and the physical parameters may be scalars or arrays over
+those axes. The result is a dict keyed by the names the analysis scripts use for each quantity.
+The sweeps are averaged with robust_average.sweep_average: by default the plain mean, clipped only
+in the bins a cheap screen flags as glitched (robust_average 'screened').
+
+Stacks stored as float32 (SweepStore with a float32 dataTrace) are computed in float32: half the
+memory and I/O of float64. The sweep means are still accumulated in float64. Every CHECK_STRIDE-th
+bin is recomputed in float64, and check_precision raises ValueError if Teff or gain deviate by
+more than TEFF_TOLERANCE (relative) or GAIN_TOLERANCE (dB). Storing a sample in float32 rounds it by at most
+6e-8 relative, far below the sweep to sweep noise.
+"""
+
+
+#%%
+#Import functions that do the work
+#----------#
+import numpy as np
+
+import robust_average as ra
+
+#%%
+#Constants and variable definitions
+#-----------------------------------------------------------------------------#
+k = 1.38e-23  # Boltzman's constand
+T0 = 290.0  # Reference temperature
+TEFF_TOLERANCE = 1e-4  # largest relative Teff deviation from float64 accepted for reduced precision (0.01 K at 100 K)
+GAIN_TOLERANCE = 0.001  # dB, the same for the gain
+Y_MARGIN = 0.01  # bins with |Y - 1| below this (Teff above ~100 x (Tref_hot - Tref_cold)) are not checked
+CHECK_STRIDE = 16  # every CHECK_STRIDE-th bin is recomputed in float64 by the automatic check
+
+
+#%%
+def _per_batch(value, dtype=float):
+    """Scalar or batch shaped parameter, broadcast against (..., bins)."""
+    return np.asarray(value, dtype=dtype)[..., np.newaxis]
+
+
+def y_factor_from_means(avePout_hot, avePout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, products=None):
+    """Y-factor results from averaged hot and cold powers (..., bins) in W. Tref_hot and Tref_cold
+    are in K, atten in dB (negative, attenuator on the noise source output) and Rbw in Hz.
+    The arithmetic is done in the precision of the powers. products limits the dB results (NF,
+    dutG_dB, Po_hot_dB, Po_cold_dB) to those named; by default all are calculated."""
+    dtype = np.result_type(avePout_hot, avePout_cold)
+    Tref_hot = _per_batch(Tref_hot, dtype)
+    Tref_cold = _per_batch(Tref_cold, dtype)
+    atten = _per_batch(atten, dtype)
+    Rbw = _per_batch(Rbw, dtype)
+    attenG = 10**(atten/10)
+    attenT = T0*(1 - attenG)/attenG
+    Y = avePout_hot/avePout_cold  # Calculate Y over frequency
+    measTeff = (Tref_hot - Tref_cold*Y)/(Y - 1)  # measured effective temperature
+    dutT = measTeff*attenG - attenT*attenG
+    aveTout_hot = avePout_hot/(k*Rbw)  # measured output temperature
+    aveTout_cold = avePout_cold/(k*Rbw)
+    dutG = (aveTout_hot - aveTout_cold)/(Tref_hot*attenG - Tref_cold)  # Gain calculation
+    result = {'avePout_hot': avePout_hot,
+              'avePout_cold': avePout_cold,
+              'Y': Y,
+              'measTeff': measTeff,
+              'dutT': dutT,
+              'dutG': dutG}
+    dB = (('NF', lambda: 10*np.log10(dutT/T0 + 1)),  # noise figure (dB)
+          ('dutG_dB', lambda: 10*np.log10(dutG) - atten),  # gain (dB)
+          ('Po_hot_dB', lambda: 10*np.log10(avePout_hot/1e-3)),  # power (dBm)
+          ('Po_cold_dB', lambda: 10*np.log10(avePout_cold/1e-3)))
+    for key, calculate in dB:
+        if products is None or key in products:
+            result[key] = calculate()
+    return result
+
+
+def check_precision(result, avePout_hot, avePout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6,
+                    bins=slice(None), teff_tolerance=TEFF_TOLERANCE, gain_tolerance=GAIN_TOLERANCE):
+    """Recompute bins of a reduced precision result in float64 from the float64 means and raise
+    ValueError if Teff (relative) or gain (dB) deviate by more than the tolerances. Bins with Y
+    within Y_MARGIN of 1 are skipped: Teff there is not defined to any precision. Returns the
+    largest deviations (relative Teff, dB)."""
+    reference = y_factor_from_means(np.asarray(avePout_hot, dtype=float)[..., bins],
+                                    np.asarray(avePout_cold, dtype=float)[..., bins],
+                                    Tref_hot, Tref_cold, atten, Rbw)
+    checked = np.abs(reference['Y'] - 1) > Y_MARGIN
+    deviation = []
+    for key, scale in (('dutT', np.abs(reference['dutT'])), ('dutG_dB', 1.0)):
+        error = np.abs(result[key][..., bins] - reference[key])/scale
+        error = np.where(np.isnan(error), np.inf, error)[checked & np.isfinite(reference[key])]  # lost values fail
+        deviation.append(float(np.max(error, initial=0.0)))
+    if deviation[0] > teff_tolerance or deviation[1] > gain_tolerance:
+        raise ValueError('%s Y-factor deviates from float64 by %.3g (Teff, relative) and %.3g dB (tolerance '
+                         '%g, %g dB), use float64' % (result['dutT'].dtype, deviation[0], deviation[1],
+                                                      teff_tolerance, gain_tolerance))
+    return tuple(deviation)
+
+
+def y_factor(Pout_hot, Pout_cold, Tref_hot, Tref_cold, atten=0.0, Rbw=2e6, dtype=None, check=True, estimator=None):
+    """Y-factor results from hot and cold sweep stacks (..., sweeps, bins) in W, averaged over
+    the sweeps axis. The hot and cold stacks may have different sweep counts.
+    estimator is the sweep average of robust_average (default robust_average.ESTIMATOR); the
+    rejected samples are returned as 'rejected_hot' and 'rejected_cold' masks (None if none).
+    dtype is the precision of the per bin arithmetic (default that of the stacks); the means are
+    accumulated in float64. Below float64 the result is checked with check_precision unless
+    check is False. The stacks may be lazy_loader.LazyArray views, which stream their means."""
+    dtype = np.dtype(dtype or np.result_type(Pout_hot.dtype, Pout_cold.dtype))
+    avePout_hot, rejected_hot = ra.sweep_average(Pout_hot, estimator or ra.ESTIMATOR)
+    avePout_cold, rejected_cold = ra.sweep_average(Pout_cold, estimator or ra.ESTIMATOR)
+    result = y_factor_from_means(avePout_hot.astype(dtype, copy=False), avePout_cold.astype(dtype, copy=False),
+                                 Tref_hot, Tref_cold, atten, Rbw)
+    if check and dtype != np.float64:
+        check_precision(result, avePout_hot, avePout_cold, Tref_hot, Tref_cold, atten, Rbw,
+                        slice(None, None, CHECK_STRIDE))
+    result['rejected_hot'] = rejected_hot
+    result['rejected_cold'] = rejected_cold
+    return result